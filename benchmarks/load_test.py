@@ -0,0 +1,263 @@
+"""Headless load test for the French Tutor app.
+
+Drives french_tutor.py and the leaderboard and history pages through
+Streamlit's AppTest with many simulated learners at once, against a freshly
+seeded database in a temp directory, with the stub TTS backend. Nothing
+touches the network or the real databases.
+
+AppTest swaps global Streamlit state (and __main__) on every run, so each
+learner gets a fresh worker process; they share the SQLite files, the way
+several app replicas would.
+
+Usage: python benchmarks/load_test.py [--users 20] [--seed-users 1000]
+"""
+import os
+import sys
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import multiprocessing
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_PASSWORD = "bench"
+
+# Point the app at a throwaway data dir before any app module reads its config.
+# Worker processes inherit the environment, so they all share one directory.
+DATA_DIR = os.environ.setdefault("FRENCH_TUTOR_BENCH_DIR", tempfile.mkdtemp(prefix="french_tutor_bench_"))
+os.makedirs(DATA_DIR, exist_ok=True)
+os.environ["FRENCH_TUTOR_DATA_DIR"] = DATA_DIR
+os.environ["FRENCH_TUTOR_AUDIO_CACHE"] = os.path.join(DATA_DIR, "audio_cache")
+os.environ["FRENCH_TUTOR_TTS_BACKEND"] = "stub"
+sys.path.insert(0, APP_DIR)
+
+import sqlite3  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+import database  # noqa: E402
+from database import transaction, migrate_all, PROGRESS_DB, USERS_DB  # noqa: E402
+from vocabulary import WORDS_CSV, read_word_pairs, sync_words  # noqa: E402
+
+
+class DBTimer:
+    """Seconds this process has spent inside SQLite calls.
+
+    AppTest runs the script on its own thread, so this is process-wide; each
+    worker process drives one app at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seconds = 0.0
+
+    def add(self, seconds):
+        with self._lock:
+            self._seconds += seconds
+
+    def take(self):
+        with self._lock:
+            seconds, self._seconds = self._seconds, 0.0
+        return seconds
+
+
+db_timer = DBTimer()
+
+
+class TimedCursor(sqlite3.Cursor):
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            db_timer.add(time.perf_counter() - start)
+
+    def execute(self, *args):
+        return self._timed(sqlite3.Cursor.execute, *args)
+
+    def executemany(self, *args):
+        return self._timed(sqlite3.Cursor.executemany, *args)
+
+    def fetchone(self):
+        return self._timed(sqlite3.Cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed(sqlite3.Cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed(sqlite3.Cursor.fetchall)
+
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+
+database.connection_factory = TimedConnection
+
+
+def seed(simulated_users, background_users, rng):
+    """Create bench users and background progress for the leaderboard and admin views"""
+    migrate_all()
+    password_hash = hashlib.sha256(BENCH_PASSWORD.encode()).hexdigest()
+    with transaction(USERS_DB) as conn:
+        conn.executemany(
+            'INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)',
+            [(f"bench{i}", password_hash, "2024-01-01T00:00:00") for i in range(simulated_users)]
+            + [(f"learner{i}", password_hash, "2024-01-01T00:00:00") for i in range(background_users)]
+        )
+
+    with transaction(PROGRESS_DB) as conn:
+        vocabulary = sync_words(conn, read_word_pairs(WORDS_CSV))
+        rows = []
+        for i in range(background_users):
+            for word_id in rng.sample(list(vocabulary), rng.randint(1, len(vocabulary))):
+                rows.append((f"learner{i}", word_id, rng.choice((1, 1, 2)),
+                             "2024-01-01T00:00:00", 1, "2024-01-01T00:00:00"))
+        conn.executemany('''
+            INSERT INTO progress (user_id, word_id, attempts, last_practiced, box, due_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+    return dict(zip(vocabulary.ids, vocabulary.french))
+
+
+class Recorder:
+    """Latency and DB time per scenario step"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.db_seconds = defaultdict(float)
+        self.errors = []
+
+    def run(self, step, at):
+        db_timer.take()
+        start = time.perf_counter()
+        at.run()
+        self.latencies[step].append(time.perf_counter() - start)
+        self.db_seconds[step] += db_timer.take()
+        if at.exception:
+            self.errors.append((step, at.exception[0].message))
+            raise RuntimeError(f"{step}: {at.exception[0].message}")
+
+    def merge(self, other):
+        for step, values in other.latencies.items():
+            self.latencies[step].extend(values)
+            self.db_seconds[step] += other.db_seconds[step]
+        self.errors.extend(other.errors)
+
+
+def click(at, label):
+    next(b for b in at.button if b.label == label).click()
+
+
+def answer(at, text):
+    next(t for t in at.text_input if t.key and t.key.startswith("word_input")).input(text)
+    click(at, "Submit")
+
+
+def simulate_user(index, french):
+    """One learner: log in, practice a few words every way, quit, browse the pages"""
+    recorder = Recorder()
+    try:
+        _scenario(index, french, recorder)
+    except Exception as e:
+        if not recorder.errors:
+            recorder.errors.append(('scenario', repr(e)))
+    return recorder
+
+
+def _scenario(index, french, recorder):
+    at = AppTest.from_file(os.path.join(APP_DIR, "french_tutor.py"), default_timeout=60)
+    recorder.run('open app', at)
+
+    at.text_input(key="login_username").input(f"bench{index}")
+    at.text_input(key="login_password").input(BENCH_PASSWORD)
+    at.button(key="login_button").click()
+    recorder.run('log in', at)
+
+    click(at, "Start New Practice")
+    recorder.run('start practice', at)
+
+    # Correct on the first try
+    answer(at, french[at.session_state.current_word])
+    recorder.run('answer correct', at)
+
+    # Wrong, ask for a hint, wrong again
+    answer(at, "pas du tout")
+    recorder.run('answer incorrect', at)
+    click(at, "💡 Hint (Listen to French pronunciation)")
+    recorder.run('hint', at)
+    answer(at, "toujours pas")
+    recorder.run('answer incorrect', at)
+
+    # Wrong, then right on the second try
+    answer(at, "non")
+    recorder.run('answer incorrect', at)
+    answer(at, french[at.session_state.current_word])
+    recorder.run('answer correct', at)
+
+    click(at, "Quit Practice")
+    recorder.run('quit', at)
+
+    for step, page in (('leaderboard', "pages/leaderboard.py"), ('history', "pages/history.py")):
+        page_test = AppTest.from_file(os.path.join(APP_DIR, page), default_timeout=60)
+        page_test.session_state.username = f"bench{index}"
+        recorder.run(step, page_test)
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def report(recorder, wall_seconds):
+    print(f"{'step':<18}{'runs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'db ms/run':>11}")
+    total_runs = 0
+    total_db = 0.0
+    for step, values in recorder.latencies.items():
+        values = sorted(values)
+        total_runs += len(values)
+        total_db += recorder.db_seconds[step]
+        print(f"{step:<18}{len(values):>6}"
+              f"{percentile(values, 0.50) * 1000:>10.1f}"
+              f"{percentile(values, 0.95) * 1000:>10.1f}"
+              f"{percentile(values, 0.99) * 1000:>10.1f}"
+              f"{values[-1] * 1000:>10.1f}"
+              f"{recorder.db_seconds[step] / len(values) * 1000:>11.2f}")
+    print(f"\n{total_runs} reruns in {wall_seconds:.2f}s ({total_runs / wall_seconds:.1f} reruns/s), "
+          f"{total_db:.2f}s in SQLite")
+    for step, message in recorder.errors[:10]:
+        print(f"error in {step}: {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20, help="simulated learners")
+    parser.add_argument('--concurrency', type=int, default=8, help="learners running at once")
+    parser.add_argument('--seed-users', type=int, default=1000, help="background users with progress")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    french = seed(args.users, args.seed_users, random.Random(args.seed))
+    print(f"Seeded {args.users} bench users and {args.seed_users} background users in {DATA_DIR}\n")
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.concurrency, max_tasks_per_child=1,
+                             mp_context=multiprocessing.get_context('spawn')) as pool:
+        for result in pool.map(simulate_user, range(args.users), [french] * args.users):
+            recorder.merge(result)
+    report(recorder, time.perf_counter() - start)
+    sys.exit(1 if recorder.errors else 0)
+
+
+if __name__ == "__main__":
+    main()
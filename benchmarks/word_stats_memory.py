@@ -0,0 +1,71 @@
+"""Memory per session of the word_stats representations.
+
+Builds --sessions copies of one learner's progress, first as the plain dict
+word_stats used to be and then as a WordStats bytearray, and reports what
+each costs per session as measured by tracemalloc. Word ids are spread over
+a --words list, with --practiced of them answered. Two more cases cover
+high word ids: a single word with id --high-id, and a deck imported late
+whose --practiced words all have ids from --high-id up.
+
+Usage: python benchmarks/word_stats_memory.py [--words 5000] [--practiced 3000]
+"""
+import os
+import sys
+import random
+import argparse
+import tracemalloc
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from stats import WordStats  # noqa: E402
+
+
+def measure(build, sessions):
+    """Bytes allocated per session while ``sessions`` results of ``build`` are alive"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = [build() for _ in range(sessions)]
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del held
+    return allocated / sessions
+
+
+def report(title, rows, sessions):
+    results = [
+        ("dict", measure(lambda: {word_id: attempts for word_id, attempts in rows}, sessions)),
+        ("WordStats", measure(lambda: WordStats(rows), sessions)),
+    ]
+
+    print(f"{title}: {sessions} sessions")
+    print(f"{'Representation':<16}{'Bytes/session':>14}{'Total MiB':>11}")
+    for name, per_session in results:
+        print(f"{name:<16}{per_session:>14,.0f}{per_session * sessions / 2 ** 20:>11.2f}")
+    print(f"dict / WordStats: {results[0][1] / results[1][1]:.1f}x")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--words', type=int, default=5000, help="size of the word list")
+    parser.add_argument('--practiced', type=int, default=3000, help="words each learner has answered")
+    parser.add_argument('--sessions', type=int, default=200, help="concurrent sessions to hold")
+    parser.add_argument('--high-id', type=int, default=1_000_005, help="first word id of the high-id cases")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    practiced = min(args.practiced, args.words)
+    word_ids = rng.sample(range(1, args.words + 1), practiced)
+    # Rows as they come off the progress table
+    rows = [(word_id, rng.choice((1, 1, 2))) for word_id in word_ids]
+    late_deck = [(args.high_id + word_id, attempts) for word_id, attempts in rows]
+
+    report(f"{practiced} of {args.words} words practiced", rows, args.sessions)
+    report(f"1 word practiced, id {args.high_id:,}", [(args.high_id, 1)], args.sessions)
+    report(f"{practiced} words practiced, ids from {args.high_id:,}", late_deck, args.sessions)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,733 @@
+import os
+import atexit
+import shutil
+import sqlite3
+import csv
+import tempfile
+import threading
+from contextlib import contextmanager
+from vocabulary import WORDS_CSV
+from rollups import period_start, PERIODS
+from decks import DEFAULT_DECK
+import metrics
+
+# Databases live next to the app unless FRENCH_TUTOR_DATA_DIR points elsewhere
+DATA_DIR = os.environ.get(
+    "FRENCH_TUTOR_DATA_DIR",
+    os.path.dirname(os.path.abspath(__file__))
+)
+
+PROGRESS_DB = "french_progress.db"
+USERS_DB = "users.db"
+GUEST_DB = "guests.db"
+
+# Scratch databases live in a per-process temp directory removed at exit
+SCRATCH_DBS = {GUEST_DB}
+_scratch_dir = None
+
+BUSY_TIMEOUT_MS = 5000
+CACHED_STATEMENTS = 256
+MAX_IDLE_CONNECTIONS = 8
+
+# Class used for new pooled connections; tools can swap in an instrumented subclass
+connection_factory = metrics.TracedConnection if metrics.ENABLED else sqlite3.Connection
+
+
+def db_path(name):
+    """Absolute path of one of the app databases"""
+    if name in SCRATCH_DBS:
+        return os.path.join(_get_scratch_dir(), name)
+    return os.path.join(DATA_DIR, name)
+
+
+def _get_scratch_dir():
+    global _scratch_dir
+    if _scratch_dir is None:
+        _scratch_dir = tempfile.mkdtemp(prefix="french_tutor_")
+        atexit.register(shutil.rmtree, _scratch_dir, ignore_errors=True)
+    return _scratch_dir
+
+
+class ConnectionPool:
+    """Reusable, tuned connections to a single SQLite database.
+
+    A connection is pinned to the thread that borrowed it until the outermost
+    ``connection()`` block exits, so nested calls on the same thread share it.
+    Idle connections are kept for the next borrower, which also keeps their
+    prepared statement caches warm.
+    """
+
+    def __init__(self, path, max_idle=MAX_IDLE_CONNECTIONS):
+        self.path = path
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,  # Connections move between Streamlit script threads
+            cached_statements=CACHED_STATEMENTS,
+            factory=connection_factory
+        )
+        # Only takes effect on a new, empty database; older ones need 'maintain --convert-vacuum'
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA synchronous = NORMAL")  # Safe with WAL, fsyncs only at checkpoints
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            yield held
+            return
+
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """Run the block in one write transaction, committed on success"""
+        with self.connection() as conn:
+            if conn.in_transaction:
+                # Nested in an outer transaction, which commits for us
+                yield conn
+                return
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name):
+    """Process-wide pool for one of the app databases"""
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                pool = _pools[name] = ConnectionPool(db_path(name))
+    return pool
+
+
+def connection(name):
+    return get_pool(name).connection()
+
+
+def transaction(name):
+    return get_pool(name).transaction()
+
+
+@contextmanager
+def attached(conn, name, alias):
+    """Attach another app database to conn for the duration of the block.
+
+    Pooled connections attach only for the length of a read that joins
+    across databases and detach right after, since a write transaction on
+    a connection locks every database attached to it.
+    """
+    conn.execute('ATTACH DATABASE ? AS ' + alias, (db_path(name),))
+    try:
+        yield conn
+    finally:
+        conn.execute('DETACH DATABASE ' + alias)
+
+
+def close_all():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
+
+
+def _rebuild_user_scores_v1(conn):
+    """rebuild_user_scores frozen at the columns migrations 1 and 3 know about"""
+    conn.execute('DELETE FROM user_scores')
+    conn.execute('''
+        INSERT INTO user_scores (user_id, perfect_words, total_words)
+        SELECT user_id,
+               COUNT(CASE WHEN attempts = 1 THEN 1 END),
+               COUNT(*)
+        FROM progress
+        GROUP BY user_id
+    ''')
+
+
+def _record_session_v1(conn, user_id, session_date, words_attempted, words_correct,
+                       perfect_words, rating):
+    """rollups.record_session frozen at the columns migration 6 knows about"""
+    conn.executemany('''
+        INSERT INTO session_rollups
+        (user_id, period, period_start, sessions, words_attempted,
+         words_correct, perfect_words, rating, best_rating)
+        VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, period, period_start) DO UPDATE SET
+            sessions = sessions + 1,
+            words_attempted = words_attempted + excluded.words_attempted,
+            words_correct = excluded.words_correct,
+            perfect_words = excluded.perfect_words,
+            rating = excluded.rating,
+            best_rating = MAX(best_rating, excluded.rating)
+    ''', [(user_id, period, period_start(period, session_date), words_attempted,
+           words_correct, perfect_words, rating, rating) for period in PERIODS])
+
+
+def _sync_words_v1(conn, csv_path):
+    """vocabulary.read_word_pairs and sync_words frozen for migrations 3 and 9; returns the list's word ids"""
+    with open(csv_path, 'r') as file:
+        pairs = [(row['spanish'], row['french']) for row in csv.DictReader(file)]
+    conn.executemany('INSERT OR IGNORE INTO words (spanish, french) VALUES (?, ?)', pairs)
+    ids = {(spanish, french): word_id
+           for word_id, spanish, french in conn.execute('SELECT id, spanish, french FROM words')}
+    return {ids[pair] for pair in pairs}
+
+
+def _sync_deck_v1(conn, deck, word_ids):
+    """decks.sync_deck and rebuild_deck_scores frozen for migration 9, which starts with no decks"""
+    conn.executemany('INSERT INTO deck_words (deck, word_id) VALUES (?, ?)',
+                     [(deck, word_id) for word_id in word_ids])
+    conn.execute('''
+        INSERT INTO deck_scores (deck, user_id, perfect_words, total_words, last_active)
+        SELECT d.deck,
+               p.user_id,
+               COUNT(CASE WHEN p.attempts = 1 THEN 1 END),
+               COUNT(*),
+               MAX(p.last_practiced)
+        FROM progress p
+        CROSS JOIN deck_words d ON d.word_id = p.word_id
+        WHERE d.deck = ?
+        GROUP BY d.deck, p.user_id
+    ''', (deck,))
+
+
+def _create_score_triggers(conn):
+    """Keep user_scores in step with every insert, update and delete on progress"""
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS progress_scores_insert
+        AFTER INSERT ON progress
+        BEGIN
+            INSERT INTO user_scores (user_id, perfect_words, total_words)
+            VALUES (NEW.user_id, NEW.attempts = 1, 1)
+            ON CONFLICT (user_id) DO UPDATE SET
+                perfect_words = perfect_words + excluded.perfect_words,
+                total_words = total_words + 1;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS progress_scores_update
+        AFTER UPDATE OF attempts ON progress
+        BEGIN
+            UPDATE user_scores
+            SET perfect_words = perfect_words + (NEW.attempts = 1) - (OLD.attempts = 1)
+            WHERE user_id = NEW.user_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS progress_scores_delete
+        AFTER DELETE ON progress
+        BEGIN
+            UPDATE user_scores
+            SET perfect_words = perfect_words - (OLD.attempts = 1),
+                total_words = total_words - 1
+            WHERE user_id = OLD.user_id;
+        END
+    ''')
+
+
+def _progress_v1(conn):
+    """Baseline schema; IF NOT EXISTS lets databases from before versioning adopt it"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS progress
+        (user_id TEXT,
+         word TEXT,
+         attempts INTEGER,
+         last_practiced TEXT,
+         PRIMARY KEY (user_id, word))
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sessions
+        (user_id TEXT PRIMARY KEY,
+         current_words TEXT,
+         word_count INTEGER,
+         last_updated TEXT)
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS session_history
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+         user_id TEXT,
+         session_date TEXT,
+         words_attempted INTEGER,
+         words_correct INTEGER,
+         perfect_words INTEGER,
+         rating REAL)
+    ''')
+
+    # Per-user score aggregate, kept current by triggers on progress
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_scores
+        (user_id TEXT PRIMARY KEY,
+         perfect_words INTEGER NOT NULL DEFAULT 0,
+         total_words INTEGER NOT NULL DEFAULT 0)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_scores_perfect
+        ON user_scores (perfect_words DESC, user_id)
+    ''')
+    _create_score_triggers(conn)
+
+    # Backfill scores when adopting a database that predates them
+    has_scores = conn.execute('SELECT EXISTS (SELECT 1 FROM user_scores)').fetchone()[0]
+    has_progress = conn.execute('SELECT EXISTS (SELECT 1 FROM progress)').fetchone()[0]
+    if has_progress and not has_scores:
+        _rebuild_user_scores_v1(conn)
+
+
+def _progress_v2(conn):
+    """Indexes for history lookups and the admin per-user aggregate"""
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_session_history_user_date
+        ON session_history (user_id, session_date)
+    ''')
+    # Covering index: admin stats group by user over attempts and last_practiced
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_progress_user_attempts
+        ON progress (user_id, attempts, last_practiced)
+    ''')
+
+
+def _progress_v3(conn):
+    """Integer word ids: a words table, and progress keyed by (user_id, word_id).
+
+    Existing rows are matched to the current word list by their Spanish text;
+    rows for words that are no longer in the list are dropped.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS words
+        (id INTEGER PRIMARY KEY,
+         spanish TEXT NOT NULL,
+         french TEXT NOT NULL,
+         UNIQUE (spanish, french))
+    ''')
+    if os.path.exists(WORDS_CSV):
+        _sync_words_v1(conn, WORDS_CSV)
+
+    conn.execute('''
+        CREATE TABLE progress_by_id
+        (user_id TEXT NOT NULL,
+         word_id INTEGER NOT NULL REFERENCES words (id),
+         attempts INTEGER,
+         last_practiced TEXT,
+         PRIMARY KEY (user_id, word_id))
+        WITHOUT ROWID
+    ''')
+    conn.execute('''
+        INSERT INTO progress_by_id (user_id, word_id, attempts, last_practiced)
+        SELECT p.user_id, w.word_id, p.attempts, p.last_practiced
+        FROM progress p
+        JOIN (SELECT spanish, MIN(id) AS word_id FROM words GROUP BY spanish) w
+          ON w.spanish = p.word
+    ''')
+    conn.execute('DROP TABLE progress')
+    conn.execute('ALTER TABLE progress_by_id RENAME TO progress')
+
+    # Dropping the old table took its triggers and index with it
+    _create_score_triggers(conn)
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_progress_user_attempts
+        ON progress (user_id, attempts, last_practiced)
+    ''')
+    _rebuild_user_scores_v1(conn)
+
+
+def _progress_v4(conn):
+    """Leitner box and due time per word, with a (user_id, due_at) review queue index"""
+    conn.execute('ALTER TABLE progress ADD COLUMN box INTEGER NOT NULL DEFAULT 1')
+    conn.execute('ALTER TABLE progress ADD COLUMN due_at TEXT')
+    # Perfect words wait a day, everything else is due right away
+    conn.execute('''
+        UPDATE progress
+        SET box = CASE WHEN attempts = 1 THEN 2 ELSE 1 END,
+            due_at = CASE WHEN attempts = 1
+                          THEN strftime('%Y-%m-%dT%H:%M:%f', last_practiced, '+1 day')
+                          ELSE last_practiced END
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_progress_user_due
+        ON progress (user_id, due_at)
+    ''')
+
+
+def _progress_v5(conn):
+    """Last activity in user_scores, so admin stats never aggregate progress"""
+    conn.execute('ALTER TABLE user_scores ADD COLUMN last_active TEXT')
+    conn.execute('''
+        UPDATE user_scores
+        SET last_active = (SELECT MAX(last_practiced) FROM progress
+                           WHERE progress.user_id = user_scores.user_id)
+    ''')
+    conn.execute('DROP TRIGGER IF EXISTS progress_scores_insert')
+    conn.execute('DROP TRIGGER IF EXISTS progress_scores_update')
+    conn.execute('''
+        CREATE TRIGGER progress_scores_insert
+        AFTER INSERT ON progress
+        BEGIN
+            INSERT INTO user_scores (user_id, perfect_words, total_words, last_active)
+            VALUES (NEW.user_id, NEW.attempts = 1, 1, NEW.last_practiced)
+            ON CONFLICT (user_id) DO UPDATE SET
+                perfect_words = perfect_words + excluded.perfect_words,
+                total_words = total_words + 1,
+                last_active = MAX(COALESCE(last_active, ''), excluded.last_active);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER progress_scores_update
+        AFTER UPDATE OF attempts, last_practiced ON progress
+        BEGIN
+            UPDATE user_scores
+            SET perfect_words = perfect_words + (NEW.attempts = 1) - (OLD.attempts = 1),
+                last_active = MAX(COALESCE(last_active, ''), NEW.last_practiced)
+            WHERE user_id = NEW.user_id;
+        END
+    ''')
+    # Sort orders offered by the admin dashboard
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_scores_total
+        ON user_scores (total_words DESC, user_id)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_scores_last_active
+        ON user_scores (last_active DESC, user_id)
+    ''')
+
+
+def _progress_v6(conn):
+    """Daily and weekly practice rollups, backfilled from session_history"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS session_rollups
+        (user_id TEXT NOT NULL,
+         period TEXT NOT NULL,
+         period_start TEXT NOT NULL,
+         sessions INTEGER NOT NULL,
+         words_attempted INTEGER NOT NULL,
+         words_correct INTEGER NOT NULL,
+         perfect_words INTEGER NOT NULL,
+         rating REAL NOT NULL,
+         best_rating REAL NOT NULL,
+         PRIMARY KEY (user_id, period, period_start))
+        WITHOUT ROWID
+    ''')
+    history = conn.execute('''
+        SELECT user_id, session_date, words_attempted, words_correct, perfect_words, rating
+        FROM session_history
+        ORDER BY id
+    ''')
+    while True:
+        rows = history.fetchmany(1000)
+        if not rows:
+            break
+        for row in rows:
+            _record_session_v1(conn, *row)
+
+
+def _progress_v7(conn):
+    """Practice checkpoints as (seed, position) instead of the unused word list column"""
+    conn.execute('DROP TABLE IF EXISTS sessions')
+    conn.execute('''
+        CREATE TABLE sessions
+        (user_id TEXT PRIMARY KEY,
+         source TEXT NOT NULL,
+         seed INTEGER,
+         deck_size INTEGER,
+         position INTEGER NOT NULL,
+         word_count INTEGER NOT NULL,
+         practice_total INTEGER NOT NULL,
+         last_updated TEXT NOT NULL)
+        WITHOUT ROWID
+    ''')
+
+
+def _progress_v8(conn):
+    """Guest progress moves to the guest store; a counter keeps the number of guests.
+
+    Old guest ids were 'guest_' plus epoch seconds. Registration used to
+    accept any name, so a registered 'guest_...' user keeps their data.
+    """
+    with connection(USERS_DB) as users:
+        has_users = users.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'"
+        ).fetchone()
+        registered = users.execute(
+            "SELECT username FROM users WHERE username GLOB 'guest_[0-9]*'"
+        ).fetchall() if has_users else []
+    conn.execute('CREATE TEMP TABLE registered_guest_names (user_id TEXT PRIMARY KEY)')
+    conn.executemany('INSERT INTO registered_guest_names (user_id) VALUES (?)', registered)
+    old_guest = ("user_id GLOB 'guest_[0-9]*' "
+                 "AND user_id NOT IN (SELECT user_id FROM registered_guest_names)")
+
+    conn.execute('''
+        CREATE TABLE counters
+        (name TEXT PRIMARY KEY,
+         value INTEGER NOT NULL)
+        WITHOUT ROWID
+    ''')
+    conn.execute(f'''
+        INSERT INTO counters (name, value)
+        SELECT 'guests', COUNT(*) FROM user_scores
+        WHERE {old_guest} AND total_words > 0
+    ''')
+    for table in ('progress', 'user_scores', 'session_history', 'session_rollups', 'sessions'):
+        conn.execute(f"DELETE FROM {table} WHERE {old_guest}")
+    conn.execute('DROP TABLE registered_guest_names')
+
+
+def _add_deck_to_history(conn):
+    """Tag session history and rollups with their deck; existing rows get the default"""
+    conn.execute(f"ALTER TABLE session_history ADD COLUMN deck TEXT NOT NULL DEFAULT '{DEFAULT_DECK}'")
+    conn.execute('DROP INDEX IF EXISTS idx_session_history_user_date')
+    conn.execute('''
+        CREATE INDEX idx_session_history_user_deck_date
+        ON session_history (user_id, deck, session_date)
+    ''')
+
+    conn.execute('''
+        CREATE TABLE session_rollups_by_deck
+        (user_id TEXT NOT NULL,
+         deck TEXT NOT NULL,
+         period TEXT NOT NULL,
+         period_start TEXT NOT NULL,
+         sessions INTEGER NOT NULL,
+         words_attempted INTEGER NOT NULL,
+         words_correct INTEGER NOT NULL,
+         perfect_words INTEGER NOT NULL,
+         rating REAL NOT NULL,
+         best_rating REAL NOT NULL,
+         PRIMARY KEY (user_id, deck, period, period_start))
+        WITHOUT ROWID
+    ''')
+    conn.execute('''
+        INSERT INTO session_rollups_by_deck
+        SELECT user_id, ?, period, period_start, sessions, words_attempted,
+               words_correct, perfect_words, rating, best_rating
+        FROM session_rollups
+    ''', (DEFAULT_DECK,))
+    conn.execute('DROP TABLE session_rollups')
+    conn.execute('ALTER TABLE session_rollups_by_deck RENAME TO session_rollups')
+
+
+def _progress_v9(conn):
+    """Vocabulary decks: word membership, per-deck scores, and deck-tagged history"""
+    conn.execute('''
+        CREATE TABLE deck_words
+        (deck TEXT NOT NULL,
+         word_id INTEGER NOT NULL REFERENCES words (id),
+         PRIMARY KEY (deck, word_id))
+        WITHOUT ROWID
+    ''')
+    # Triggers find the decks of the word that was just answered
+    conn.execute('CREATE INDEX idx_deck_words_word ON deck_words (word_id, deck)')
+
+    # Per-deck score aggregate, one index per leaderboard and admin sort order
+    conn.execute('''
+        CREATE TABLE deck_scores
+        (deck TEXT NOT NULL,
+         user_id TEXT NOT NULL,
+         perfect_words INTEGER NOT NULL DEFAULT 0,
+         total_words INTEGER NOT NULL DEFAULT 0,
+         last_active TEXT,
+         PRIMARY KEY (deck, user_id))
+        WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_deck_scores_perfect
+        ON deck_scores (deck, perfect_words DESC, user_id)
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_deck_scores_total
+        ON deck_scores (deck, total_words DESC, user_id)
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_deck_scores_last_active
+        ON deck_scores (deck, last_active DESC, user_id)
+    ''')
+    conn.execute('''
+        CREATE TRIGGER progress_deck_scores_insert
+        AFTER INSERT ON progress
+        BEGIN
+            INSERT INTO deck_scores (deck, user_id, perfect_words, total_words, last_active)
+            SELECT deck, NEW.user_id, NEW.attempts = 1, 1, NEW.last_practiced
+            FROM deck_words
+            WHERE word_id = NEW.word_id
+            ON CONFLICT (deck, user_id) DO UPDATE SET
+                perfect_words = perfect_words + excluded.perfect_words,
+                total_words = total_words + 1,
+                last_active = MAX(COALESCE(last_active, ''), excluded.last_active);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER progress_deck_scores_update
+        AFTER UPDATE OF attempts, last_practiced ON progress
+        BEGIN
+            UPDATE deck_scores
+            SET perfect_words = perfect_words + (NEW.attempts = 1) - (OLD.attempts = 1),
+                last_active = MAX(COALESCE(last_active, ''), NEW.last_practiced)
+            WHERE user_id = NEW.user_id
+              AND deck IN (SELECT deck FROM deck_words WHERE word_id = NEW.word_id);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER progress_deck_scores_delete
+        AFTER DELETE ON progress
+        BEGIN
+            UPDATE deck_scores
+            SET perfect_words = perfect_words - (OLD.attempts = 1),
+                total_words = total_words - 1
+            WHERE user_id = OLD.user_id
+              AND deck IN (SELECT deck FROM deck_words WHERE word_id = OLD.word_id);
+        END
+    ''')
+    # The existing word list becomes the default deck, scored from current progress
+    if os.path.exists(WORDS_CSV):
+        _sync_deck_v1(conn, DEFAULT_DECK, _sync_words_v1(conn, WORDS_CSV))
+
+    _add_deck_to_history(conn)
+    conn.execute(f"ALTER TABLE sessions ADD COLUMN deck TEXT NOT NULL DEFAULT '{DEFAULT_DECK}'")
+
+
+def _progress_v10(conn):
+    """Drop user_scores: leaderboard and admin stats read deck_scores since v9"""
+    for trigger in ('progress_scores_insert', 'progress_scores_update', 'progress_scores_delete'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    conn.execute('DROP TABLE IF EXISTS user_scores')  # Takes its sort indexes with it
+
+
+def _progress_v11(conn):
+    """Progress by word, so a deck gaining or losing words rescores only those words"""
+    conn.execute('CREATE INDEX idx_progress_word ON progress (word_id)')
+
+
+def _users_v1(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users
+        (username TEXT PRIMARY KEY,
+         password_hash TEXT,
+         created_at TEXT)
+    ''')
+
+
+def _guests_v1(conn):
+    """The progress tables guests use, plus when each guest was last seen"""
+    conn.execute('''
+        CREATE TABLE guests
+        (guest_id TEXT PRIMARY KEY,
+         last_seen TEXT NOT NULL)
+        WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX idx_guests_last_seen ON guests (last_seen)')
+    conn.execute('''
+        CREATE TABLE progress
+        (user_id TEXT NOT NULL,
+         word_id INTEGER NOT NULL,
+         attempts INTEGER,
+         last_practiced TEXT,
+         box INTEGER NOT NULL DEFAULT 1,
+         due_at TEXT,
+         PRIMARY KEY (user_id, word_id))
+        WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX idx_progress_user_due ON progress (user_id, due_at)')
+    conn.execute('''
+        CREATE TABLE session_history
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+         user_id TEXT,
+         session_date TEXT,
+         words_attempted INTEGER,
+         words_correct INTEGER,
+         perfect_words INTEGER,
+         rating REAL)
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_session_history_user_date
+        ON session_history (user_id, session_date)
+    ''')
+    conn.execute('''
+        CREATE TABLE session_rollups
+        (user_id TEXT NOT NULL,
+         period TEXT NOT NULL,
+         period_start TEXT NOT NULL,
+         sessions INTEGER NOT NULL,
+         words_attempted INTEGER NOT NULL,
+         words_correct INTEGER NOT NULL,
+         perfect_words INTEGER NOT NULL,
+         rating REAL NOT NULL,
+         best_rating REAL NOT NULL,
+         PRIMARY KEY (user_id, period, period_start))
+        WITHOUT ROWID
+    ''')
+
+
+def _guests_v2(conn):
+    """Deck-tagged guest history, matching the progress database"""
+    _add_deck_to_history(conn)
+
+
+# Migrations run in order and each bumps PRAGMA user_version by one.
+# Only ever append to these lists; released migrations must not change.
+MIGRATIONS = {
+    PROGRESS_DB: [_progress_v1, _progress_v2, _progress_v3, _progress_v4, _progress_v5,
+                  _progress_v6, _progress_v7, _progress_v8, _progress_v9,
+                  _progress_v10, _progress_v11],
+    USERS_DB: [_users_v1],
+    GUEST_DB: [_guests_v1, _guests_v2],
+}
+
+
+def migrate(name):
+    """Bring a database up to the latest schema version in place"""
+    migrations = MIGRATIONS[name]
+    with transaction(name) as conn:
+        # Read inside the write transaction so concurrent starters don't both migrate
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for number, migration in enumerate(migrations[version:], start=version + 1):
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {number}')
+    return len(migrations)
+
+
+def migrate_all():
+    for name in MIGRATIONS:
+        migrate(name)
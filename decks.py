@@ -0,0 +1,132 @@
+"""Vocabulary decks: word lists by level or topic, each loaded on first use.
+
+The built-in word list is DEFAULT_DECK; every other deck is a CSV in
+DECKS_DIR named after the deck. Listing decks only reads the directory.
+A deck's words join the shared words table and its membership is kept in
+deck_words the first time it is used, so progress stays per word and a
+word learned in one deck counts in every deck that has it. Per-deck
+scores live in deck_scores, kept current by triggers on progress.
+"""
+import os
+import re
+from vocabulary import WORDS_CSV
+
+DECKS_DIR = os.environ.get(
+    "FRENCH_TUTOR_DECKS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "decks")
+)
+DEFAULT_DECK = "french_words"
+DECK_NAME = re.compile(r'[a-z0-9][a-z0-9_-]{0,63}')
+
+
+def deck_names():
+    """The default deck, then the others by name"""
+    try:
+        files = os.listdir(DECKS_DIR)
+    except FileNotFoundError:
+        files = []
+    names = sorted(name for name, ext in map(os.path.splitext, files)
+                   if ext == '.csv' and DECK_NAME.fullmatch(name) and name != DEFAULT_DECK)
+    return [DEFAULT_DECK] + names
+
+
+def deck_title(name):
+    return name.replace('_', ' ').replace('-', ' ').title()
+
+
+def deck_csv(name):
+    """Path of a deck's word list; names are lowercase letters, digits, - and _"""
+    if name == DEFAULT_DECK:
+        return WORDS_CSV
+    if not DECK_NAME.fullmatch(name):
+        raise ValueError(f"Invalid deck name {name!r}: use lowercase letters, digits, '-' and '_'")
+    return os.path.join(DECKS_DIR, f"{name}.csv")
+
+
+def sync_deck(conn, deck, vocabulary):
+    """Match deck_words to the deck's current word list, rescoring only the words that changed"""
+    current = {word_id for (word_id,) in conn.execute(
+        'SELECT word_id FROM deck_words WHERE deck = ?', (deck,))}
+    wanted = set(vocabulary.ids)
+    added, removed = sorted(wanted - current), sorted(current - wanted)
+    if not added and not removed:
+        return False
+    conn.executemany('DELETE FROM deck_words WHERE deck = ? AND word_id = ?',
+                     [(deck, word_id) for word_id in removed])
+    conn.executemany('INSERT INTO deck_words (deck, word_id) VALUES (?, ?)',
+                     [(deck, word_id) for word_id in added])
+    _score_added_words(conn, deck, added)
+    _unscore_removed_words(conn, deck, removed)
+    return True
+
+
+def _score_added_words(conn, deck, word_ids):
+    """Count progress on words new to the deck, as the insert trigger would have"""
+    conn.executemany('''
+        INSERT INTO deck_scores (deck, user_id, perfect_words, total_words, last_active)
+        SELECT ?, user_id, attempts = 1, 1, last_practiced
+        FROM progress
+        WHERE word_id = ?
+        ON CONFLICT (deck, user_id) DO UPDATE SET
+            perfect_words = perfect_words + excluded.perfect_words,
+            total_words = total_words + 1,
+            last_active = MAX(COALESCE(last_active, ''), excluded.last_active)
+    ''', [(deck, word_id) for word_id in word_ids])
+
+
+def _unscore_removed_words(conn, deck, word_ids):
+    """Take progress on words that left the deck back out of its scores.
+
+    Counts come straight off. Last activity can't be taken back, so it is
+    recomputed from their own progress rows for the learners whose latest
+    answer in the deck was one of those words.
+    """
+    users, stale = set(), set()
+    for word_id in word_ids:
+        rows = conn.execute('''
+            SELECT p.user_id, p.attempts, p.last_practiced >= s.last_active
+            FROM progress p
+            JOIN deck_scores s ON s.deck = ? AND s.user_id = p.user_id
+            WHERE p.word_id = ?
+        ''', (deck, word_id)).fetchall()
+        conn.executemany('''
+            UPDATE deck_scores
+            SET perfect_words = perfect_words - ?, total_words = total_words - 1
+            WHERE deck = ? AND user_id = ?
+        ''', [(attempts == 1, deck, user_id) for user_id, attempts, _ in rows])
+        users.update(user_id for user_id, _, _ in rows)
+        stale.update(user_id for user_id, _, latest in rows if latest)
+    conn.executemany('''
+        UPDATE deck_scores
+        SET last_active = (SELECT MAX(p.last_practiced)
+                           FROM progress p
+                           JOIN deck_words d ON d.deck = deck_scores.deck AND d.word_id = p.word_id
+                           WHERE p.user_id = deck_scores.user_id)
+        WHERE deck = ? AND user_id = ?
+    ''', [(deck, user_id) for user_id in sorted(stale)])
+    conn.executemany('DELETE FROM deck_scores WHERE deck = ? AND user_id = ? AND total_words <= 0',
+                     [(deck, user_id) for user_id in sorted(users)])
+
+
+def rebuild_deck_scores(conn, deck=None):
+    """Recompute deck_scores from progress, for one deck or for all of them.
+
+    One pass over progress, each row matched to its decks by word id; for
+    manage.py rebuild-scores, since triggers handle answers and sync_deck
+    rescores just the words a deck gains or loses.
+    """
+    where = 'WHERE d.deck = ?' if deck else ''
+    params = (deck,) if deck else ()
+    conn.execute(f'DELETE FROM deck_scores {"WHERE deck = ?" if deck else ""}', params)
+    conn.execute(f'''
+        INSERT INTO deck_scores (deck, user_id, perfect_words, total_words, last_active)
+        SELECT d.deck,
+               p.user_id,
+               COUNT(CASE WHEN p.attempts = 1 THEN 1 END),
+               COUNT(*),
+               MAX(p.last_practiced)
+        FROM progress p
+        CROSS JOIN deck_words d ON d.word_id = p.word_id
+        {where}
+        GROUP BY d.deck, p.user_id
+    ''', params)
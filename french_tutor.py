@@ -1,16 +1,74 @@
 import os
-import sqlite3
 import hashlib
-import time
 from datetime import datetime
 import streamlit as st
-import csv
 import random
 import json
-from gtts import gTTS
-import tempfile
-import base64
 import pandas as pd
+from database import connection, transaction, attached, db_path, migrate_all, PROGRESS_DB, USERS_DB, GUEST_DB
+from vocabulary import Vocabulary, read_word_pairs, sync_words, import_words
+from decks import DEFAULT_DECK, deck_names, deck_title, deck_csv, sync_deck
+from scheduler import due_words, count_due
+from writebehind import writer
+from practice import Deck, new_seed, load_checkpoint
+from itertools import islice
+from guests import guest_writer, new_guest_id, is_guest, guest_count, GUEST_PREFIX
+from stats import WordStats, ProgressStats
+import uuid
+from contextlib import contextmanager
+from tts import audio_prefetcher, tts_backend, PREFETCH_AHEAD
+import metrics
+from metrics import traced
+
+_csv_digests = {}
+
+ADMIN_PAGE_SIZE = 50
+DECK_CACHE_SIZE = 8
+HISTORY_PAGE_SIZE = 25
+HISTORY_TREND_PERIODS = 30
+
+# Admin dashboard sort options, each backed by an index on deck_scores
+ADMIN_SORTS = {
+    'Rating': 'perfect_words',
+    'Words Practiced': 'total_words',
+    'Last Active': 'last_active',
+}
+
+
+@st.cache_resource(show_spinner=False)
+def bootstrap_databases():
+    """Migrate the databases once per process instead of on every rerun"""
+    migrate_all()
+    return True
+
+
+def vocabulary_version(csv_path):
+    """Content hash of the word list, re-hashed only when its mtime or size changes"""
+    stat = os.stat(csv_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _csv_digests.get(csv_path)
+    if cached is None or cached[0] != signature:
+        digest = hashlib.sha256()
+        with open(csv_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 16), b''):
+                digest.update(chunk)
+        cached = _csv_digests[csv_path] = (signature, digest.hexdigest())
+    return cached[1]
+
+
+@st.cache_resource(max_entries=DECK_CACHE_SIZE, show_spinner=False)
+def load_vocabulary(deck, digest):
+    """Sync a deck's words and membership once per content version.
+
+    Shared by every session in the process; decks nobody has opened are
+    never read, and the least recently used ones are evicted.
+    """
+    pairs = read_word_pairs(deck_csv(deck))
+    with transaction(PROGRESS_DB) as conn:
+        vocabulary = sync_words(conn, pairs)
+        sync_deck(conn, deck, vocabulary)
+        return vocabulary
+
 
 class FrenchTutor:
     def __init__(self):
@@ -19,49 +77,14 @@ class FrenchTutor:
         self.check_authentication()
         
         if 'word_stats' not in st.session_state:
-            st.session_state.word_stats = self.load_progress()
+            self.load_progress()
+        if 'dirty_words' not in st.session_state:
+            st.session_state.dirty_words = {}
             
+    @traced
     def setup_db(self):
         try:
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            db_path = os.path.join(script_dir, "french_progress.db")
-            
-            conn = sqlite3.connect(db_path)
-            c = conn.cursor()
-            
-            # Create progress table
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS progress
-                (user_id TEXT,
-                 word TEXT,
-                 attempts INTEGER,
-                 last_practiced TEXT,
-                 PRIMARY KEY (user_id, word))
-            ''')
-            
-            # Create sessions table
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS sessions
-                (user_id TEXT PRIMARY KEY,
-                 current_words TEXT,
-                 word_count INTEGER,
-                 last_updated TEXT)
-            ''')
-            
-            # Create session history table
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS session_history
-                (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 user_id TEXT,
-                 session_date TEXT,
-                 words_attempted INTEGER,
-                 words_correct INTEGER,
-                 perfect_words INTEGER,
-                 rating REAL)
-            ''')
-            
-            conn.commit()
-            conn.close()
+            bootstrap_databases()
         except Exception as e:
             st.error(f"Could not setup database: {str(e)}")
 
@@ -71,12 +94,12 @@ class FrenchTutor:
         
     def show_login(self):
         st.markdown("### 🇫🇷 French Tutor Login")
+        self.show_feedback()
         
         # Add guest login button with warning
         st.warning("⚠️ Guest progress will be lost when you close the browser", icon="⚠️")
         if st.button("👤 Continue as Guest", use_container_width=True):
-            guest_id = f"guest_{int(time.time())}"
-            st.session_state.username = guest_id
+            st.session_state.username = new_guest_id()
             st.rerun()
         
         st.write("---")
@@ -101,6 +124,8 @@ class FrenchTutor:
             if st.button("Login", key="login_button"):
                 if self.verify_credentials(username, password):
                     st.session_state.username = username
+                    # The pre-login run cached empty word stats
+                    self.load_progress()
                     st.rerun()
                 else:
                     st.error("Invalid username or password")
@@ -128,24 +153,20 @@ class FrenchTutor:
             
             if st.button("Register", key="register_button"):
                 if self.register_user(new_username, new_password, confirm_password):
-                    st.success("Registration successful! Please login.")
-                    time.sleep(2)
+                    st.session_state.feedback = ('success', "Registration successful! Please login.")
                     st.rerun()
 
+    @traced
     def verify_credentials(self, username, password):
         try:
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            db_path = os.path.join(script_dir, "users.db")
-            
-            if not os.path.exists(db_path):
+            if not os.path.exists(db_path(USERS_DB)):
                 st.error("No users database found")
                 return False
             
-            conn = sqlite3.connect(db_path)
-            c = conn.cursor()
-            
-            c.execute('SELECT password_hash FROM users WHERE username = ?', (username,))
-            result = c.fetchone()
+            with connection(USERS_DB) as conn:
+                c = conn.cursor()
+                c.execute('SELECT password_hash FROM users WHERE username = ?', (username,))
+                result = c.fetchone()
             
             if not result:
                 return False
@@ -153,13 +174,13 @@ class FrenchTutor:
             stored_hash = result[0]
             password_hash = hashlib.sha256(password.encode()).hexdigest()
             
-            conn.close()
             return stored_hash == password_hash
             
         except Exception as e:
             st.error(f"Login failed: {str(e)}")
             return False
 
+    @traced
     def register_user(self, username, password, confirm_password):
         try:
             if not username or not password:
@@ -170,229 +191,369 @@ class FrenchTutor:
                 st.error("Passwords do not match")
                 return False
             
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            db_path = os.path.join(script_dir, "users.db")
-            
-            conn = sqlite3.connect(db_path)
-            c = conn.cursor()
-            
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS users
-                (username TEXT PRIMARY KEY,
-                 password_hash TEXT,
-                 created_at TEXT)
-            ''')
-            
-            c.execute('SELECT username FROM users WHERE username = ?', (username,))
-            if c.fetchone():
-                st.error("Username already exists")
-                conn.close()
+            if username.startswith(GUEST_PREFIX):
+                st.error(f"Usernames starting with '{GUEST_PREFIX}' are reserved")
                 return False
             
-            password_hash = hashlib.sha256(password.encode()).hexdigest()
-            
-            c.execute('''
-                INSERT INTO users (username, password_hash, created_at)
-                VALUES (?, ?, ?)
-            ''', (username, password_hash, datetime.now().isoformat()))
+            with transaction(USERS_DB) as conn:
+                c = conn.cursor()
+                
+                c.execute('SELECT username FROM users WHERE username = ?', (username,))
+                if c.fetchone():
+                    st.error("Username already exists")
+                    return False
+                
+                password_hash = hashlib.sha256(password.encode()).hexdigest()
+                
+                c.execute('''
+                    INSERT INTO users (username, password_hash, created_at)
+                    VALUES (?, ?, ?)
+                ''', (username, password_hash, datetime.now().isoformat()))
             
-            conn.commit()
-            conn.close()
             return True
             
         except Exception as e:
             st.error(f"Registration failed: {str(e)}")
             return False
 
+    @traced
     def load_progress(self):
+        """Load the learner's word stats and the counters kept alongside them"""
+        st.session_state.word_stats = WordStats()
+        st.session_state.progress_stats = ProgressStats()
         try:
             if 'username' not in st.session_state:
-                return {}
-                
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            db_path = os.path.join(script_dir, "french_progress.db")
-            
-            conn = sqlite3.connect(db_path)
-            c = conn.cursor()
-            
-            c.execute('SELECT word, attempts FROM progress WHERE user_id = ?', 
-                     (st.session_state.username,))
-            results = c.fetchall()
+                return
             
-            conn.close()
+            db, store_writer = self.progress_store(st.session_state.username)
+            store_writer.flush()  # Include answers still queued from an earlier session
+            with connection(db) as conn:
+                c = conn.cursor()
+                c.execute('SELECT word_id, attempts FROM progress WHERE user_id = ?', 
+                         (st.session_state.username,))
+                results = c.fetchall()
             
-            return {word: attempts for word, attempts in results}
+            st.session_state.word_stats = WordStats(results)
+            st.session_state.progress_stats = ProgressStats.for_deck(st.session_state.word_stats, self.words)
             
         except Exception as e:
             st.error(f"Could not load progress: {str(e)}")
-            return {}
 
+    def record_attempt(self, word_id, attempts):
+        """Update a word's attempts and counters and mark it for the next save"""
+        st.session_state.progress_stats.record(st.session_state.word_stats.get(word_id), attempts)
+        st.session_state.word_stats[word_id] = attempts
+        st.session_state.dirty_words[word_id] = datetime.now().isoformat()
+
+    @traced
     def save_progress(self):
+        """Upsert only the words changed since the last save"""
         try:
             if 'username' not in st.session_state:
                 return
-                
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            db_path = os.path.join(script_dir, "french_progress.db")
             
-            conn = sqlite3.connect(db_path)
-            c = conn.cursor()
-            
-            for word, attempts in st.session_state.word_stats.items():
-                c.execute('''
-                    INSERT OR REPLACE INTO progress 
-                    (user_id, word, attempts, last_practiced)
-                    VALUES (?, ?, ?, ?)
-                ''', (st.session_state.username, word, attempts, 
-                     datetime.now().isoformat()))
-            
-            conn.commit()
-            conn.close()
+            dirty_words = st.session_state.get('dirty_words')
+            if not dirty_words:
+                return
+                
+            username = st.session_state.username
+            _, store_writer = self.progress_store(username)
+            store_writer.save(
+                progress=[(username, word_id, st.session_state.word_stats[word_id], last_practiced)
+                          for word_id, last_practiced in dirty_words.items()],
+                checkpoints=self.practice_checkpoint()
+            )
+            dirty_words.clear()
         except Exception as e:
             st.error(f"Could not save progress: {str(e)}")
 
+    @traced
+    def count_due_words(self):
+        """Number of practiced words due for review now"""
+        try:
+            db, store_writer = self.progress_store(st.session_state.username)
+            store_writer.flush()
+            with self.deck_connection(db) as conn:
+                return count_due(conn, st.session_state.username, self.deck)
+        except Exception as e:
+            st.error(f"Could not check due words: {str(e)}")
+            return 0
+
+    @traced
+    def upcoming_words(self, limit):
+        """The next practice words after the current one, pulled lazily"""
+        if st.session_state.practice_source == 'review':
+            try:
+                db, store_writer = self.progress_store(st.session_state.username)
+                store_writer.flush()  # Answers just given change what is due
+                with self.deck_connection(db) as conn:
+                    due = due_words(conn, st.session_state.username, self.deck, limit + 1)
+            except Exception as e:
+                st.error(f"Could not load due words: {str(e)}")
+                return []
+            return [w for w in due if w != st.session_state.current_word][:limit]
+        
+        unseen = self.practice_deck().unseen(st.session_state.practice_position + 1,
+                                             st.session_state.word_stats)
+        return [word_id for _, word_id in islice(unseen, limit)]
+
+    @traced
+    def next_practice_word(self):
+        """Next word of the run, or None when the run is over"""
+        if st.session_state.practice_source == 'review':
+            try:
+                db, store_writer = self.progress_store(st.session_state.username)
+                store_writer.flush()  # Answers just given change what is due
+                with self.deck_connection(db) as conn:
+                    due = due_words(conn, st.session_state.username, self.deck, 1)
+            except Exception as e:
+                st.error(f"Could not load due words: {str(e)}")
+                return None
+            return due[0] if due else None
+        
+        # Walk the deck past words already practiced, in this run or before it
+        unseen = self.practice_deck().unseen(st.session_state.practice_position,
+                                             st.session_state.word_stats)
+        position, word_id = next(unseen, (None, None))
+        if word_id is not None:
+            st.session_state.practice_position = position
+        return word_id
+
+    def practice_deck(self):
+        """The current new-word run's order, rebuilt from its seed on each rerun"""
+        return Deck(self.words, st.session_state.practice_seed, st.session_state.practice_deck_size)
+
+    def practice_checkpoint(self):
+        """[(user_id, state)] describing the current run, for writer.save; guests get none"""
+        username = st.session_state.get('username')
+        if not username or is_guest(username) or not st.session_state.get('practice_mode'):
+            return []
+        return [(username, {
+            'deck': self.deck,
+            'source': st.session_state.practice_source,
+            'seed': st.session_state.get('practice_seed'),
+            'deck_size': st.session_state.get('practice_deck_size'),
+            'position': st.session_state.get('practice_position', 0),
+            'word_count': st.session_state.word_count,
+            'practice_total': st.session_state.practice_total,
+        })]
+
+    def start_practice(self, source, total, seed=None):
+        """Begin a run of new words (shuffled by ``seed``) or of due reviews"""
+        st.session_state.practice_source = source
+        st.session_state.practice_total = total
+        st.session_state.practice_seed = seed
+        st.session_state.practice_deck_size = len(self.words) if seed is not None else None
+        st.session_state.practice_position = 0
+        st.session_state.current_word = None
+        st.session_state.word_count = 0
+        st.session_state.practice_mode = True
+        try:
+            writer.save(checkpoints=self.practice_checkpoint())
+        except Exception as e:
+            st.error(f"Could not save practice checkpoint: {str(e)}")
+
+    @traced
+    def resume_practice(self):
+        """Restore the user's unfinished run from its checkpoint, if there is one"""
+        username = st.session_state.get('username')
+        if not username or is_guest(username):
+            return False
+        try:
+            writer.flush()
+            with connection(PROGRESS_DB) as conn:
+                state = load_checkpoint(conn, username)
+        except Exception as e:
+            st.error(f"Could not load practice checkpoint: {str(e)}")
+            return False
+        if state is None:
+            return False
+
+        if state['deck'] not in deck_names():
+            return False  # The deck was removed; start afresh
+        if state['deck'] != self.deck:
+            self.select_deck(state['deck'])
+        st.session_state.practice_source = state['source']
+        st.session_state.practice_total = state['practice_total']
+        st.session_state.practice_seed = state['seed']
+        st.session_state.practice_deck_size = state['deck_size']
+        st.session_state.practice_position = state['position']
+        st.session_state.current_word = None
+        st.session_state.word_count = state['word_count']
+        st.session_state.feedback = ('success', "▶️ Welcome back! Picking up your practice where you left off.")
+        return True
+
+    def end_practice(self, record=True):
+        """Close the current run, optionally recording it, and drop its checkpoint"""
+        self.cancel_prefetch()
+        if record:
+            self.save_session_history()
+        else:
+            try:
+                writer.save(checkpoints=[(user_id, None) for user_id, _ in self.practice_checkpoint()])
+            except Exception as e:
+                st.error(f"Could not clear practice checkpoint: {str(e)}")
+        st.session_state.practice_mode = False
+        st.session_state.current_word = None
+
+    @traced
     def load_words(self):
+        """Load the session's deck, falling back to the default if it is gone"""
+        if st.session_state.get('deck') not in deck_names():
+            st.session_state.deck = DEFAULT_DECK
+        self.deck = st.session_state.deck
         try:
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            csv_path = os.path.join(script_dir, 'french_words.csv')
-            
-            with open(csv_path, 'r') as file:
-                reader = csv.DictReader(file)
-                self.words = [(row['spanish'], row['french']) for row in reader]
+            self.words = load_vocabulary(self.deck, vocabulary_version(deck_csv(self.deck)))
         except Exception as e:
             st.error(f"Could not load words: {str(e)}")
-            self.words = [("hola", "bonjour")]
+            self.words = Vocabulary()
+
+    def select_deck(self, deck):
+        """Switch the session to another deck; word stats carry over, counters are per deck"""
+        st.session_state.deck = deck
+        self.load_words()
+        st.session_state.progress_stats = ProgressStats.for_deck(st.session_state.word_stats, self.words)
 
+    @traced
     def speak_word(self, word):
-        """Generate speech for the French word"""
+        """Generate speech for the French word, reusing cached audio"""
         try:
-            tts = gTTS(text=word, lang='fr')  # Use French language
-            audio_bytes = tempfile.NamedTemporaryFile(suffix='.mp3')
-            tts.save(audio_bytes.name)
-            
-            with open(audio_bytes.name, 'rb') as f:
-                audio_data = f.read()
-            
-            audio_bytes.close()
-            return audio_data
+            return audio_prefetcher.get(word, 'fr')
             
         except Exception as e:
             st.error(f"Error generating audio: {str(e)}")
             return None
 
+    @traced
+    def prefetch_audio(self):
+        """Start generating audio for the current and next few practice words"""
+        if 'prefetch_id' not in st.session_state:
+            st.session_state.prefetch_id = uuid.uuid4().hex
+        
+        upcoming = [st.session_state.current_word] + self.upcoming_words(PREFETCH_AHEAD - 1)
+        audio_prefetcher.prefetch(st.session_state.prefetch_id,
+                                  [self.words.pair(word_id)[1] for word_id in upcoming], 'fr')
+
+    def cancel_prefetch(self):
+        """Stop background audio work for this session"""
+        if 'prefetch_id' in st.session_state:
+            audio_prefetcher.cancel(st.session_state.prefetch_id)
+
     def is_admin(self, username):
         """Check if user is admin"""
         return username == "admin"  # You can modify this to include more admin users
 
-    def get_user_stats(self):
-        """Get statistics for all users"""
+    def progress_store(self, username):
+        """(database, writer) holding a user's progress; guests get the scratch store"""
+        if is_guest(username):
+            return GUEST_DB, guest_writer
+        return PROGRESS_DB, writer
+
+    @contextmanager
+    def deck_connection(self, db):
+        """A connection to a progress store that can join the deck's words in deck_words"""
+        with connection(db) as conn:
+            if db == PROGRESS_DB:
+                yield conn
+            else:
+                # deck_words only lives in the progress database
+                with attached(conn, PROGRESS_DB, 'shared'):
+                    yield conn
+
+    @traced
+    def get_user_stats(self, sort_by='Rating', page=1, page_size=ADMIN_PAGE_SIZE):
+        """Get one sorted page of per-user statistics in the current deck plus user counts"""
         try:
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            users_db = os.path.join(script_dir, "users.db")
-            progress_db = os.path.join(script_dir, "french_progress.db")
-            
-            users_conn = sqlite3.connect(users_db)
-            progress_conn = sqlite3.connect(progress_db)
-            
-            uc = users_conn.cursor()
-            pc = progress_conn.cursor()
-            
-            # Get registered users
-            uc.execute('SELECT username, created_at FROM users')
-            registered_users = uc.fetchall()
-            
-            # Get all users' progress
-            pc.execute('''
-                SELECT user_id, COUNT(DISTINCT word) as words_practiced,
-                       COUNT(CASE WHEN attempts = 1 THEN 1 END) as perfect_words,
-                       MAX(last_practiced) as last_active
-                FROM progress
-                GROUP BY user_id
-            ''')
-            progress_data = pc.fetchall()
-            
-            # Combine the data
-            user_stats = []
-            guest_count = 0
-            
-            for user_id, words, perfect, last_active in progress_data:
-                is_guest = user_id.startswith('guest_')
-                if is_guest:
-                    guest_count += 1
+            total_words = len(self.words)
+            offset = (page - 1) * page_size
+            
+            with connection(PROGRESS_DB) as conn, attached(conn, USERS_DB, 'users'):
+                c = conn.cursor()
                 
-                # Calculate rating based on total words in list
-                rating = (perfect / len(self.words) * 100) if len(self.words) > 0 else 0
-                remaining = len(self.words) - words
+                # Counts straight from the indexes, no per-user rows
+                c.execute('''
+                    SELECT (SELECT COUNT(*) FROM users.users),
+                           (SELECT COUNT(*) FROM deck_scores WHERE deck = ? AND total_words > 0)
+                ''', (self.deck,))
+                total_registered, total_rows = c.fetchone()
+                total_guests = guest_count(conn)  # Guests only leave a counter behind
                 
-                user_stats.append({
-                    'Username': user_id,
-                    'Type': 'Guest' if is_guest else 'Registered',
-                    'Words Practiced': words,
-                    'Perfect Words': perfect,
-                    'Remaining Words': remaining,
-                    'Rating': f"{rating:.1f}%",
-                    'Last Active': datetime.fromisoformat(last_active).strftime('%Y-%m-%d %H:%M')
-                })
-            
-            users_conn.close()
-            progress_conn.close()
+                # Rating, remaining words and last active computed, sorted and paged in SQL;
+                # the unary + keeps the filter off the indexes so the sort's own index is used
+                c.execute(f'''
+                    SELECT user_id,
+                           total_words,
+                           perfect_words,
+                           ? - total_words,
+                           COALESCE(perfect_words * 100.0 / NULLIF(?, 0), 0),
+                           strftime('%Y-%m-%d %H:%M', last_active)
+                    FROM deck_scores
+                    WHERE deck = ? AND +total_words > 0
+                    ORDER BY {ADMIN_SORTS[sort_by]} DESC, user_id
+                    LIMIT ? OFFSET ?
+                ''', (total_words, total_words, self.deck, page_size, offset))
+                rows = c.fetchall()
+            
+            user_stats = [{
+                'Username': user_id,
+                'Words Practiced': words,
+                'Perfect Words': perfect,
+                'Remaining Words': remaining,
+                'Rating': f"{rating:.1f}%",
+                'Last Active': last_active
+            } for user_id, words, perfect, remaining, rating, last_active in rows]
             
             return {
                 'user_stats': user_stats,
-                'total_registered': len(registered_users),
-                'total_guests': guest_count
+                'total_registered': total_registered,
+                'total_guests': total_guests,
+                'total_rows': total_rows
             }
             
         except Exception as e:
             st.error(f"Could not get user statistics: {str(e)}")
             return None
 
+    @traced
     def save_session_history(self):
         try:
             if 'username' not in st.session_state:
                 return
                 
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            db_path = os.path.join(script_dir, "french_progress.db")
-            
             # Calculate session stats
-            words_attempted = len(st.session_state.current_words)
-            words_correct = len([w for w in st.session_state.word_stats if st.session_state.word_stats[w] <= 2])
-            perfect_words = len([w for w in st.session_state.word_stats if st.session_state.word_stats[w] == 1])
-            rating = (perfect_words / len(self.words) * 100) if len(self.words) > 0 else 0
-            
-            conn = sqlite3.connect(db_path)
-            c = conn.cursor()
-            
-            c.execute('''
-                INSERT INTO session_history 
-                (user_id, session_date, words_attempted, words_correct, perfect_words, rating)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (st.session_state.username, datetime.now().isoformat(), 
-                 words_attempted, words_correct, perfect_words, rating))
-            
-            conn.commit()
-            conn.close()
+            words_attempted = st.session_state.word_count
+            words_correct = st.session_state.progress_stats.completed
+            perfect_words = st.session_state.progress_stats.perfect
+            rating = st.session_state.progress_stats.rating(len(self.words))
+            
+            session = (st.session_state.username, self.deck, datetime.now().isoformat(),
+                       words_attempted, words_correct, perfect_words, rating)
+            
+            # The run is over, so its checkpoint goes in the same write
+            _, store_writer = self.progress_store(st.session_state.username)
+            store_writer.save(
+                sessions=[session],
+                checkpoints=[(user_id, None) for user_id, _ in self.practice_checkpoint()]
+            )
         except Exception as e:
             st.error(f"Could not save session history: {str(e)}")
 
-    def get_session_history(self, username):
+    @traced
+    def get_session_history(self, username, page=1, page_size=HISTORY_PAGE_SIZE):
+        """Get one page of a user's raw sessions in the current deck, newest first"""
         try:
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            db_path = os.path.join(script_dir, "french_progress.db")
-            
-            conn = sqlite3.connect(db_path)
-            c = conn.cursor()
-            
-            c.execute('''
-                SELECT session_date, words_attempted, words_correct, perfect_words, rating
-                FROM session_history
-                WHERE user_id = ?
-                ORDER BY session_date DESC
-            ''', (username,))
-            
-            results = c.fetchall()
-            conn.close()
+            db, store_writer = self.progress_store(username)
+            store_writer.flush()
+            with connection(db) as conn:
+                c = conn.cursor()
+                c.execute('''
+                    SELECT session_date, words_attempted, words_correct, perfect_words, rating
+                    FROM session_history
+                    WHERE user_id = ? AND deck = ?
+                    ORDER BY session_date DESC
+                    LIMIT ? OFFSET ?
+                ''', (username, self.deck, page_size, (page - 1) * page_size))
+                results = c.fetchall()
             
             return [{
                 'Date': datetime.fromisoformat(date).strftime('%Y-%m-%d %H:%M'),
@@ -406,6 +567,62 @@ class FrenchTutor:
             st.error(f"Could not get session history: {str(e)}")
             return []
 
+    @traced
+    def get_history_trends(self, username, period='day', limit=HISTORY_TREND_PERIODS):
+        """Get the latest daily or weekly rollups for a user in the current deck, oldest first"""
+        try:
+            db, store_writer = self.progress_store(username)
+            store_writer.flush()
+            with connection(db) as conn:
+                c = conn.cursor()
+                c.execute('''
+                    SELECT period_start, sessions, words_attempted, perfect_words, rating, best_rating
+                    FROM session_rollups
+                    WHERE user_id = ? AND deck = ? AND period = ?
+                    ORDER BY period_start DESC
+                    LIMIT ?
+                ''', (username, self.deck, period, limit))
+                results = c.fetchall()
+            
+            return [{
+                'Period': start,
+                'Sessions': sessions,
+                'Words Attempted': attempted,
+                'Perfect Words': perfect,
+                'Rating': rating,
+                'Best Rating': best_rating
+            } for start, sessions, attempted, perfect, rating, best_rating in reversed(results)]
+            
+        except Exception as e:
+            st.error(f"Could not get history trends: {str(e)}")
+            return []
+
+    def show_feedback(self):
+        """Show the message left by the previous action, and any notice, once"""
+        feedback = st.session_state.pop('feedback', None)
+        notice = st.session_state.pop('notice', None)
+        if feedback is not None:
+            self.show_message(*feedback)
+        if notice is not None:
+            st.info(notice)
+
+    def show_message(self, kind, message):
+        if kind == 'correct':
+            st.balloons()  # Add celebratory balloons
+            st.success(message)
+            progress_messages = [
+                "You're getting closer to Paris! 🗼",
+                "The Eiffel Tower awaits! ✨",
+                "Your French is improving! 🎨",
+                "Très bien! Keep going! 🎭",
+                "You're becoming a French master! 🎪"
+            ]
+            st.write(random.choice(progress_messages))
+        elif kind == 'success':
+            st.success(message)
+        else:
+            st.error(message)
+
     def check_apostrophe_difference(self, user_input, correct_word):
         """Check if the only difference is a missing apostrophe"""
         user_no_apos = user_input.replace("'", "")
@@ -472,87 +689,58 @@ class FrenchTutor:
         distance = journey_length - current_position
         return journey_html, distance
 
+    @traced
     def get_leaderboard(self):
-        """Get top 10 users by rating"""
+        """Get top 10 users by rating in the current deck"""
         try:
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            progress_db = os.path.join(script_dir, "french_progress.db")
-            
-            conn = sqlite3.connect(progress_db)
-            c = conn.cursor()
-            
-            # Get user progress and calculate ratings
-            c.execute('''
-                SELECT user_id,
-                       COUNT(DISTINCT word) as total_words,
-                       COUNT(CASE WHEN attempts = 1 THEN 1 END) as perfect_words
-                FROM progress
-                GROUP BY user_id
-            ''')
-            results = c.fetchall()
-            
-            # Calculate ratings and create leaderboard
-            leaderboard = []
+            # Top scores come straight off the (deck, perfect_words) index
+            with connection(PROGRESS_DB) as conn:
+                c = conn.cursor()
+                c.execute('''
+                    SELECT user_id, total_words, perfect_words
+                    FROM deck_scores
+                    WHERE deck = ?
+                    ORDER BY perfect_words DESC, user_id
+                    LIMIT 10
+                ''', (self.deck,))
+                results = c.fetchall()
+            
+            top_10 = []
             for user_id, total_words, perfect_words in results:
-                # Skip guest users
-                if user_id.startswith('guest_'):
-                    continue
-                    
                 rating = (perfect_words / len(self.words) * 100) if len(self.words) > 0 else 0
-                leaderboard.append({
+                top_10.append({
                     'Username': user_id,
                     'Words Mastered': perfect_words,
                     'Total Progress': f"{(total_words / len(self.words) * 100):.1f}%",
-                    'Rating': rating
+                    'Rating': f"{rating:.1f}%"
                 })
             
-            # Sort by rating and get top 10
-            leaderboard.sort(key=lambda x: x['Rating'], reverse=True)
-            top_10 = leaderboard[:10]
-            
-            # Format ratings
-            for entry in top_10:
-                entry['Rating'] = f"{entry['Rating']:.1f}%"
-            
-            conn.close()
             return top_10
             
         except Exception as e:
             st.error(f"Could not get leaderboard: {str(e)}")
             return []
 
-    def add_words_from_csv(self, csv_content):
-        """Add new words from uploaded CSV"""
+    @traced
+    def add_words_from_csv(self, csv_file, deck, progress=None):
+        """Add new words to a deck, created if new, from an uploaded CSV file object.
+
+        Returns (rows read, words added), or None if the import failed.
+        """
         try:
-            # Read CSV content
-            import io
-            df = pd.read_csv(io.StringIO(csv_content.decode('utf-8')))
-            
-            # Validate columns
-            if not all(col in df.columns for col in ['spanish', 'french']):
-                raise ValueError("CSV must have 'spanish' and 'french' columns")
-            
-            # Load current words
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            csv_path = os.path.join(script_dir, 'french_words.csv')
-            
-            # Read existing words
-            existing_df = pd.read_csv(csv_path)
+            csv_path = deck_csv(deck)
+            with connection(PROGRESS_DB) as conn:
+                total_words, new_words = import_words(conn, csv_file, csv_path, progress)
             
-            # Combine and remove duplicates
-            combined_df = pd.concat([existing_df, df]).drop_duplicates(subset=['spanish', 'french'])
+            # Reload words, the new content hash picks a fresh cache entry
+            if deck == self.deck:
+                self.select_deck(deck)
             
-            # Save back to CSV
-            combined_df.to_csv(csv_path, index=False)
-            
-            # Reload words
-            self.load_words()
-            
-            return len(df), len(combined_df) - len(existing_df)
+            return total_words, new_words
             
         except Exception as e:
             st.error(f"Error processing CSV: {str(e)}")
-            return 0, 0
+            return None
 
 def main():
     st.set_page_config(
@@ -591,8 +779,6 @@ def main():
     # Initialize session state variables
     if 'current_word' not in st.session_state:
         st.session_state.current_word = None
-    if 'current_words' not in st.session_state:
-        st.session_state.current_words = []
     if 'word_count' not in st.session_state:
         st.session_state.word_count = 0
     if 'current_audio' not in st.session_state:
@@ -608,24 +794,38 @@ def main():
     
     if 'username' not in st.session_state:
         return
+    
+    # Resume before drawing anything, the run may belong to another deck
+    if 'practice_mode' not in st.session_state:
+        st.session_state.practice_mode = tutor.resume_practice()
         
     # Sidebar with statistics
     with st.sidebar:
         # Add logout button at the top
         if 'username' in st.session_state:
             if st.button("🚪 Logout", key="logout_button"):
+                tutor.cancel_prefetch()
                 for key in list(st.session_state.keys()):
                     del st.session_state[key]
                 st.rerun()
+        
+        # Decks are switched between runs; progress and rating are per deck
+        decks = deck_names()
+        deck = st.selectbox("📚 Deck", decks, index=decks.index(tutor.deck),
+                            format_func=deck_title, disabled=st.session_state.practice_mode)
+        if deck != tutor.deck:
+            tutor.select_deck(deck)
+            st.rerun()
             
         st.header("Progress")
         total_words = len(tutor.words)
-        completed = len([w for w in st.session_state.word_stats if st.session_state.word_stats[w] <= 2])
-        perfect = len([w for w in st.session_state.word_stats if st.session_state.word_stats[w] == 1])
+        progress_stats = st.session_state.progress_stats
+        completed = progress_stats.completed
+        perfect = progress_stats.perfect
         
         # Calculate rating based on total words in list
-        rating_percentage = (perfect / total_words * 100) if total_words > 0 else 0
-        remaining_words = total_words - len(st.session_state.word_stats)
+        rating_percentage = progress_stats.rating(total_words)
+        remaining_words = progress_stats.remaining(total_words)
         
         # Display rating with appropriate emoji
         if rating_percentage >= 90:
@@ -667,17 +867,38 @@ def main():
         
         # Add word upload section
         st.write("### 📝 Add New Words")
+        target = st.selectbox("Add to deck", deck_names() + ["➕ New deck"],
+                              format_func=lambda name: name if name == "➕ New deck" else deck_title(name),
+                              key="upload_deck")
+        if target == "➕ New deck":
+            target = st.text_input("New deck name (lowercase letters, digits, - and _)",
+                                   key="new_deck_name").strip()
         uploaded_file = st.file_uploader(
             "Upload CSV file with new words (must have 'spanish' and 'french' columns)",
             type=['csv']
         )
         
-        if uploaded_file is not None:
-            file_contents = uploaded_file.read()
-            total_words, new_words = tutor.add_words_from_csv(file_contents)
-            if total_words > 0:
-                st.success(f"✅ Processed {total_words} words, added {new_words} new words!")
-                st.info("Reload the page to see the updated word list.")
+        # Import each upload once, not again on every rerun while it stays selected
+        if (uploaded_file is not None and target
+                and st.session_state.get('imported_file') != uploaded_file.file_id):
+            import_progress = st.progress(0.0, text="Importing words...")
+            uploaded_file.seek(0)  # An earlier failed attempt may have read part of it
+            result = tutor.add_words_from_csv(
+                uploaded_file,
+                target,
+                lambda rows: import_progress.progress(
+                    min(uploaded_file.tell() / max(uploaded_file.size, 1), 1.0),
+                    text=f"Imported {rows} rows..."
+                )
+            )
+            import_progress.empty()
+            # A failed import is retried on the next rerun, e.g. once the deck name is fixed
+            if result is not None:
+                st.session_state.imported_file = uploaded_file.file_id
+                total_words, new_words = result
+                if total_words > 0:
+                    st.success(f"✅ Processed {total_words} words, added {new_words} new words to {deck_title(target)}!")
+                    st.info("Reload the page to see the updated word list.")
         
         with st.expander("CSV Format Example"):
             st.code("""spanish,french
@@ -692,7 +913,13 @@ bailar,danser""")
                 key='download-template'
             )
         
-        stats = tutor.get_user_stats()
+        col1, col2 = st.columns(2)
+        with col1:
+            sort_by = st.selectbox("Sort users by", list(ADMIN_SORTS), key="admin_sort")
+        with col2:
+            page = st.number_input("Page", min_value=1, value=1, step=1, key="admin_page")
+        
+        stats = tutor.get_user_stats(sort_by, page)
         if stats:
             col1, col2, col3 = st.columns(3)
             with col1:
@@ -703,22 +930,17 @@ bailar,danser""")
                 st.metric("Guest Users", stats['total_guests'])
             
             st.write("---")
-            st.write("User Details:")
+            page_count = max(1, -(-stats['total_rows'] // ADMIN_PAGE_SIZE))
+            st.write(f"User Details (page {page} of {page_count}):")
             
-            # Create DataFrame for user stats
+            # Rows arrive sorted and formatted from the database
             df = pd.DataFrame(stats['user_stats'])
             
-            # Sort by Rating (descending)
-            df['Rating'] = df['Rating'].str.rstrip('%').astype(float)
-            df = df.sort_values('Rating', ascending=False)
-            df['Rating'] = df['Rating'].apply(lambda x: f"{x:.1f}%")
-            
             # Display the DataFrame
             st.dataframe(
                 df,
                 column_config={
                     "Username": st.column_config.TextColumn("User", width=150),
-                    "Type": st.column_config.TextColumn("Type", width=100),
                     "Words Practiced": st.column_config.NumberColumn("Words", width=80),
                     "Perfect Words": st.column_config.NumberColumn("Perfect", width=80),
                     "Remaining Words": st.column_config.NumberColumn("Remaining Words", width=100),
@@ -728,51 +950,77 @@ bailar,danser""")
                 hide_index=True
             )
 
+        with st.expander("⏱️ Performance Metrics"):
+            if not metrics.ENABLED:
+                st.info("Set FRENCH_TUTOR_METRICS=1 and restart the app to record timings.")
+            else:
+                st.dataframe(
+                    pd.DataFrame(metrics.recorder.summary()),
+                    column_config={
+                        column: st.column_config.NumberColumn(column, format="%.2f")
+                        for column in ('Total ms', 'Mean ms', 'p50 ms', 'p95 ms', 'Max ms')
+                    },
+                    hide_index=True
+                )
+                st.write("Latest spans:")
+                st.dataframe(pd.DataFrame(metrics.recorder.latest()), hide_index=True)
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.download_button(
+                        "📥 Prometheus Metrics",
+                        metrics.recorder.prometheus(),
+                        "metrics.txt",
+                        "text/plain",
+                        key='download-metrics'
+                    )
+                with col2:
+                    if st.button("Reset Metrics", key="reset_metrics"):
+                        metrics.recorder.reset()
+                        st.rerun()
+
     # Main practice area
-    if 'practice_mode' not in st.session_state:
-        st.session_state.practice_mode = False
+    # Move on before showing feedback: if the run just ended, the rerun below
+    # must not take the last answer's message with it
+    if st.session_state.practice_mode and st.session_state.current_word is None:
+        next_word = tutor.next_practice_word()
+        if next_word is None:
+            # Run finished
+            if st.session_state.word_count:
+                st.session_state.notice = f"🎉 Practice complete! You practiced {st.session_state.word_count} words."
+            tutor.end_practice(record=bool(st.session_state.word_count))
+            st.rerun()
+        
+        st.session_state.current_word = next_word
+        st.session_state.attempts = 0
+        st.session_state.current_audio = None
+        st.session_state.show_hint = False
+        tutor.prefetch_audio()
+    
+    tutor.show_feedback()
     
     if not st.session_state.practice_mode:
         col1, col2 = st.columns(2)
         with col1:
             if st.button("Start New Practice"):
-                available_words = [w for w in tutor.words if w[0] not in st.session_state.word_stats]
-                st.session_state.current_words = random.sample(
-                    available_words,
-                    len(available_words)
-                )
-                st.session_state.practice_mode = True
-                st.session_state.word_count = 0
+                available = st.session_state.progress_stats.remaining(len(tutor.words))
+                tutor.start_practice('new', available, seed=new_seed())
                 st.rerun()
         
         with col2:
-            if st.button("Practice Wrong Words"):
-                wrong_words = [w for w in tutor.words if w[0] in st.session_state.word_stats 
-                             and st.session_state.word_stats[w[0]] > 1]
-                if wrong_words:
-                    st.session_state.current_words = random.sample(
-                        wrong_words,
-                        len(wrong_words)
-                    )
-                    st.session_state.practice_mode = True
-                    st.session_state.word_count = 0
+            if st.button("Review Due Words"):
+                # Review words are pulled one at a time from the due queue
+                due_count = tutor.count_due_words()
+                if due_count:
+                    tutor.start_practice('review', due_count)
                     st.rerun()
                 else:
-                    st.warning("No words to practice!")
+                    st.warning("No words due for review!")
     
     else:  # Practice mode
-        if not st.session_state.current_words:
-            st.session_state.practice_mode = False
-            st.rerun()
-            
-        if st.session_state.current_word is None:
-            st.session_state.current_word = st.session_state.current_words[st.session_state.word_count]
-            st.session_state.attempts = 0
-            st.session_state.current_audio = None
-            st.session_state.show_hint = False
-            
+        spanish, french = tutor.words.pair(st.session_state.current_word)
+        
         # Display progress
-        total_practice_words = len(st.session_state.current_words)
+        total_practice_words = max(st.session_state.practice_total, st.session_state.word_count + 1)
         st.write(f"Word {st.session_state.word_count + 1} of {total_practice_words}")
         
         # Show French jokes randomly (about 30% chance)
@@ -782,13 +1030,13 @@ bailar,danser""")
                 st.write("Take a breath and continue learning! 🎨")
         
         # Display Spanish word
-        st.markdown(f"### 🇪🇸 Spanish: {st.session_state.current_word[0]}")
+        st.markdown(f"### 🇪🇸 Spanish: {spanish}")
         
         # Only show hint button after first wrong attempt
         if st.session_state.attempts == 1:
             if st.button("💡 Hint (Listen to French pronunciation)"):
                 st.session_state.show_hint = True
-                st.session_state.current_audio = tutor.speak_word(st.session_state.current_word[1])
+                st.session_state.current_audio = tutor.speak_word(french)
                 st.rerun()
         
         # Only show audio after wrong attempt or hint
@@ -797,12 +1045,9 @@ bailar,danser""")
             with col1:
                 st.markdown("### 🔊")
             with col2:
-                audio_html = f'''
-                    <audio controls>
-                        <source src="data:audio/mpeg;base64,{base64.b64encode(st.session_state.current_audio).decode()}" type="audio/mpeg">
-                    </audio>
-                    '''
-                st.components.v1.html(audio_html, height=50)
+                # Served once from Streamlit's media endpoint under a content-hash URL,
+                # so reruns send the same short URL instead of re-encoding the audio
+                st.audio(st.session_state.current_audio, format=tts_backend.mime_type)
         
         # Word input form
         with st.form(key=f"word_form_{st.session_state.word_count}_{st.session_state.attempts}"):
@@ -812,21 +1057,12 @@ bailar,danser""")
             submit_button = st.form_submit_button("Submit")
             
             if submit_button:
-                if user_input == st.session_state.current_word[1].lower():
-                    st.balloons()  # Add celebratory balloons
-                    st.success("✨ Correct! Magnifique! 🎨")
-                    progress_messages = [
-                        "You're getting closer to Paris! 🗼",
-                        "The Eiffel Tower awaits! ✨",
-                        "Your French is improving! 🎨",
-                        "Très bien! Keep going! 🎭",
-                        "You're becoming a French master! 🎪"
-                    ]
-                    st.write(random.choice(progress_messages))
-                    st.session_state.word_stats[st.session_state.current_word[0]] = st.session_state.attempts + 1
-                    tutor.save_progress()
-                    time.sleep(2)
+                # Feedback is shown on the next rerun so the script thread never sleeps
+                if user_input == french.lower():
+                    st.session_state.feedback = ('correct', "✨ Correct! Magnifique! 🎨")
+                    tutor.record_attempt(st.session_state.current_word, st.session_state.attempts + 1)
                     st.session_state.word_count += 1
+                    tutor.save_progress()
                     st.session_state.current_word = None
                     st.session_state.current_audio = None
                     st.session_state.show_hint = False
@@ -835,32 +1071,28 @@ bailar,danser""")
                     st.session_state.attempts += 1
                     if st.session_state.attempts == 1:
                         # Check for apostrophe
-                        if tutor.check_apostrophe_difference(user_input, st.session_state.current_word[1].lower()):
-                            st.error("❌ Almost! Don't forget the apostrophe!")
+                        if tutor.check_apostrophe_difference(user_input, french.lower()):
+                            st.session_state.feedback = ('error', "❌ Almost! Don't forget the apostrophe!")
                         else:
-                            st.error("❌ Incorrect. Try once more!")
-                        st.session_state.current_audio = tutor.speak_word(st.session_state.current_word[1])
-                        time.sleep(1)
+                            st.session_state.feedback = ('error', "❌ Incorrect. Try once more!")
+                        st.session_state.current_audio = tutor.speak_word(french)
                         st.rerun()
                     else:
-                        st.error(f"❌ Incorrect. The correct word is: {st.session_state.current_word[1]}")
-                        st.session_state.word_stats[st.session_state.current_word[0]] = st.session_state.attempts
-                        tutor.save_progress()
-                        time.sleep(3)
+                        st.session_state.feedback = ('error', f"❌ Incorrect. The correct word is: {french}")
+                        tutor.record_attempt(st.session_state.current_word, st.session_state.attempts)
                         st.session_state.word_count += 1
+                        tutor.save_progress()
                         st.session_state.current_word = None
                         st.session_state.current_audio = None
                         st.session_state.show_hint = False
                         st.rerun()
         
         if st.button("Quit Practice"):
-            tutor.save_session_history()
-            st.session_state.practice_mode = False
-            st.session_state.current_word = None
-            st.session_state.current_words = []
+            tutor.end_practice()
             st.rerun()
 
     st.markdown("<br><hr><div style='text-align: center; color: gray; font-size: 0.8em; padding: 20px;'>Developed by LBC Productions</div>", unsafe_allow_html=True)
 
 if __name__ == "__main__":
-    main()
+    with metrics.span('rerun'):
+        main()
@@ -0,0 +1,92 @@
+"""Ephemeral progress for guest learners.
+
+Guests practice against GUEST_DB, a scratch database private to this
+process, so their answers never reach the shared progress tables. Guests
+idle for longer than GUEST_TTL are swept out at most once per
+SWEEP_INTERVAL. The shared database only keeps a running count of guests
+who practiced, for the admin dashboard.
+"""
+import re
+import uuid
+import threading
+from datetime import datetime, timedelta
+from database import transaction, GUEST_DB, PROGRESS_DB
+from writebehind import write_progress, write_sessions
+
+GUEST_PREFIX = "guest_"
+GUEST_ID = re.compile(GUEST_PREFIX + "[0-9a-f]{32}")
+GUEST_TTL = timedelta(hours=12)
+SWEEP_INTERVAL = timedelta(minutes=10)
+
+
+def new_guest_id():
+    return f"{GUEST_PREFIX}{uuid.uuid4().hex}"
+
+
+def is_guest(user_id):
+    """Only ids from new_guest_id; older registered names may also start with the prefix"""
+    return GUEST_ID.fullmatch(user_id) is not None
+
+
+def expire_guests(conn, now=None):
+    """Drop everything stored for guests idle past GUEST_TTL; returns how many"""
+    cutoff = ((now or datetime.now()) - GUEST_TTL).isoformat()
+    expired = conn.execute('SELECT guest_id FROM guests WHERE last_seen < ?', (cutoff,)).fetchall()
+    for table in ('progress', 'session_history', 'session_rollups'):
+        conn.executemany(f'DELETE FROM {table} WHERE user_id = ?', expired)
+    conn.executemany('DELETE FROM guests WHERE guest_id = ?', expired)
+    return len(expired)
+
+
+def guest_count(conn):
+    """Guests who have practiced, from the progress database's counters"""
+    row = conn.execute("SELECT value FROM counters WHERE name = 'guests'").fetchone()
+    return row[0] if row else 0
+
+
+class GuestWriter:
+    """Writes guests' saves to the scratch database, with the writers' interface"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_sweep = datetime.min
+
+    def save(self, progress=(), sessions=(), checkpoints=()):
+        """Write progress and sessions; guests are never checkpointed"""
+        now = datetime.now()
+        guest_ids = {row[0] for row in progress} | {row[0] for row in sessions}
+        with transaction(GUEST_DB) as conn:
+            new_guests = [guest_id for guest_id in guest_ids if conn.execute(
+                'SELECT 1 FROM guests WHERE guest_id = ?', (guest_id,)
+            ).fetchone() is None]
+            conn.executemany('''
+                INSERT INTO guests (guest_id, last_seen) VALUES (?, ?)
+                ON CONFLICT (guest_id) DO UPDATE SET last_seen = excluded.last_seen
+            ''', [(guest_id, now.isoformat()) for guest_id in guest_ids])
+            write_progress(conn, progress)
+            write_sessions(conn, sessions)
+
+        if new_guests:
+            with transaction(PROGRESS_DB) as conn:
+                conn.execute('''
+                    INSERT INTO counters (name, value) VALUES ('guests', ?)
+                    ON CONFLICT (name) DO UPDATE SET value = value + excluded.value
+                ''', (len(new_guests),))
+        self._sweep(now)
+
+    def _sweep(self, now):
+        with self._lock:
+            if now < self._next_sweep:
+                return
+            self._next_sweep = now + SWEEP_INTERVAL
+        with transaction(GUEST_DB) as conn:
+            expire_guests(conn, now)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+guest_writer = GuestWriter()
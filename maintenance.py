@@ -0,0 +1,139 @@
+"""Retention and compaction for the progress database.
+
+Every step works in chunks of at most MAINTENANCE_CHUNK rows (or pages),
+each in its own short transaction, so the app keeps writing in between.
+"""
+import os
+import csv
+import gzip
+import time
+from datetime import datetime, timedelta
+from database import connection, transaction, db_path, DATA_DIR, PROGRESS_DB, USERS_DB
+
+MAINTENANCE_CHUNK = 2000
+ARCHIVE_DIR = os.path.join(DATA_DIR, "archive")
+HISTORY_COLUMNS = ('id', 'user_id', 'deck', 'session_date', 'words_attempted',
+                   'words_correct', 'perfect_words', 'rating')
+
+
+def archive_history(keep_days, archive_dir=ARCHIVE_DIR, chunk=MAINTENANCE_CHUNK, pause=0.0):
+    """Move session_history rows older than ``keep_days`` into a gzipped CSV.
+
+    Daily and weekly trends live on in session_rollups. Each chunk is
+    written to the archive before it is deleted, so an interrupted run
+    can at worst archive a few rows twice. Returns (rows, archive path).
+    """
+    cutoff = (datetime.now() - timedelta(days=keep_days)).isoformat()
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"session_history-{datetime.now():%Y%m%d-%H%M%S}.csv.gz")
+
+    archived = 0
+    last_id = 0
+    with gzip.open(path, 'wt', newline='') as archive:
+        writer = csv.writer(archive)
+        writer.writerow(HISTORY_COLUMNS)
+        while True:
+            with transaction(PROGRESS_DB) as conn:
+                rows = conn.execute(f'''
+                    SELECT {", ".join(HISTORY_COLUMNS)} FROM session_history
+                    WHERE id > ? AND session_date < ?
+                    ORDER BY id
+                    LIMIT ?
+                ''', (last_id, cutoff, chunk)).fetchall()
+                if not rows:
+                    break
+                writer.writerows(rows)
+                archive.flush()
+                conn.executemany('DELETE FROM session_history WHERE id = ?', [(row[0],) for row in rows])
+            archived += len(rows)
+            last_id = rows[-1][0]
+            time.sleep(pause)
+
+    if not archived:
+        os.remove(path)
+        path = None
+    return archived, path
+
+
+def _progress_users(conn):
+    """Each user id in progress once, skipping along the primary key instead of reading every row"""
+    user_id = conn.execute('SELECT MIN(user_id) FROM progress').fetchone()[0]
+    while user_id is not None:
+        yield user_id
+        user_id = conn.execute(
+            'SELECT MIN(user_id) FROM progress WHERE user_id > ?', (user_id,)
+        ).fetchone()[0]
+
+
+def prune_orphans(chunk=MAINTENANCE_CHUNK, pause=0.0):
+    """Delete progress, scores and checkpoints of users missing from users.db.
+
+    Returns (users, progress rows) removed. Does nothing if users.db has no
+    users at all, which more likely means the wrong data directory than an
+    empty app.
+    """
+    with connection(USERS_DB) as conn:
+        users = {username for (username,) in conn.execute('SELECT username FROM users')}
+    if not users:
+        return 0, 0
+
+    with connection(PROGRESS_DB) as conn:
+        orphans = [user_id for user_id in _progress_users(conn) if user_id not in users]
+
+    removed = 0
+    for user_id in orphans:
+        while True:
+            with transaction(PROGRESS_DB) as conn:
+                deleted = conn.execute('''
+                    DELETE FROM progress
+                    WHERE user_id = ? AND word_id IN (
+                        SELECT word_id FROM progress WHERE user_id = ? LIMIT ?)
+                ''', (user_id, user_id, chunk)).rowcount
+                if deleted < chunk:
+                    conn.execute('DELETE FROM deck_scores WHERE user_id = ?', (user_id,))
+                    conn.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))
+            removed += deleted
+            time.sleep(pause)
+            if deleted < chunk:
+                break
+    return len(orphans), removed
+
+
+def compact(chunk=MAINTENANCE_CHUNK, pause=0.0, convert=False):
+    """Return free pages to the filesystem and refresh planner statistics.
+
+    Incremental vacuum needs auto_vacuum=INCREMENTAL. New databases start
+    that way; an older one only picks it up with one full VACUUM, which
+    locks the database for the whole rebuild and so runs only when
+    ``convert`` is set. Returns (pages freed, or None if the database is
+    not in incremental mode; whether a full VACUUM ran).
+    """
+    full_vacuum = False
+    with connection(PROGRESS_DB) as conn:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2 and convert:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            full_vacuum = True
+
+        freed = None
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            freed = 0
+            while True:
+                free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+                if not free:
+                    break
+                conn.execute(f'PRAGMA incremental_vacuum({min(free, chunk)})').fetchall()
+                freed += min(free, chunk)
+                time.sleep(pause)
+
+        conn.execute('PRAGMA analysis_limit = 1000')  # Sample, don't scan, big indexes
+        conn.execute('ANALYZE')
+        conn.commit()
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+    return freed, full_vacuum
+
+
+def file_bytes(name):
+    """Size on disk of a database and its write-ahead log"""
+    path = db_path(name)
+    return sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p))
@@ -0,0 +1,174 @@
+"""Maintenance commands for the French Tutor databases.
+
+Usage: python manage.py <command>
+"""
+import argparse
+import sys
+import time
+from database import connection, transaction, migrate, MIGRATIONS, PROGRESS_DB, USERS_DB, SCRATCH_DBS
+from vocabulary import import_words
+from decks import DEFAULT_DECK, deck_csv, rebuild_deck_scores
+from maintenance import archive_history, prune_orphans, compact, file_bytes, MAINTENANCE_CHUNK, ARCHIVE_DIR
+
+# Hot queries that must be answered from an index, with sample parameters
+INDEXED_QUERIES = [
+    ('session history', '''
+        SELECT session_date, words_attempted, words_correct, perfect_words, rating
+        FROM session_history
+        WHERE user_id = ? AND deck = ?
+        ORDER BY session_date DESC
+    ''', ('someone', DEFAULT_DECK)),
+    ('leaderboard', '''
+        SELECT user_id, total_words, perfect_words
+        FROM deck_scores
+        WHERE deck = ?
+        ORDER BY perfect_words DESC, user_id
+        LIMIT 10
+    ''', (DEFAULT_DECK,)),
+    ('admin stats', '''
+        SELECT user_id, total_words, perfect_words, last_active
+        FROM deck_scores
+        WHERE deck = ? AND +total_words > 0
+        ORDER BY last_active DESC, user_id
+        LIMIT 50 OFFSET 0
+    ''', (DEFAULT_DECK,)),
+    ('history trends', '''
+        SELECT period_start, sessions, words_attempted, perfect_words, rating, best_rating
+        FROM session_rollups
+        WHERE user_id = ? AND deck = ? AND period = ?
+        ORDER BY period_start DESC
+        LIMIT 30
+    ''', ('someone', DEFAULT_DECK, 'day')),
+    ('review queue', '''
+        SELECT p.word_id
+        FROM progress p
+        JOIN deck_words d ON d.deck = ? AND d.word_id = p.word_id
+        WHERE p.user_id = ? AND p.due_at <= ?
+        ORDER BY p.due_at
+        LIMIT ?
+    ''', (DEFAULT_DECK, 'someone', '2024-01-01T00:00:00', 10)),
+    ('deck rescore', '''
+        SELECT user_id, attempts FROM progress WHERE word_id = ?
+    ''', (1,)),
+]
+
+
+def rebuild_scores(args):
+    """Backfill deck_scores from the progress table"""
+    migrate(PROGRESS_DB)
+    start = time.perf_counter()
+    with transaction(PROGRESS_DB) as conn:
+        rebuild_deck_scores(conn)
+        users, decks = conn.execute(
+            'SELECT COUNT(DISTINCT user_id), COUNT(DISTINCT deck) FROM deck_scores'
+        ).fetchone()
+    print(f"Rebuilt scores for {users} users in {decks} decks in {time.perf_counter() - start:.2f}s")
+
+
+def run_migrations(args):
+    """Upgrade every database to the latest schema version"""
+    for name in MIGRATIONS:
+        if name in SCRATCH_DBS:
+            continue  # Created fresh by each app process
+        with connection(name) as conn:
+            before = conn.execute('PRAGMA user_version').fetchone()[0]
+        after = migrate(name)
+        print(f"{name}: version {before} -> {after}")
+
+
+def check_indexes(args):
+    """Verify with EXPLAIN QUERY PLAN that hot queries use indexes"""
+    migrate(PROGRESS_DB)
+    failures = 0
+    with connection(PROGRESS_DB) as conn:
+        for label, sql, params in INDEXED_QUERIES:
+            plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+            ok = all('INDEX' in step or 'PRIMARY KEY' in step
+                     for step in plan if step.startswith(('SCAN', 'SEARCH')))
+            ok = ok and not any('TEMP B-TREE' in step for step in plan)
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {label}: {'; '.join(plan)}")
+    sys.exit(1 if failures else 0)
+
+
+def import_word_file(args):
+    """Stream a CSV of spanish,french pairs into a deck's word list"""
+    migrate(PROGRESS_DB)
+    start = time.perf_counter()
+    csv_path = deck_csv(args.deck)
+    with open(args.csv_file, 'rb') as upload:
+        with connection(PROGRESS_DB) as conn:
+            rows, added = import_words(
+                conn, upload, csv_path,
+                lambda rows: print(f"  {rows} rows read", end='\r', flush=True)
+            )
+    if rows:
+        print()  # Move past the progress line
+    print(f"Read {rows} rows, added {added} new words to {args.deck} in {time.perf_counter() - start:.2f}s")
+
+
+def maintain(args):
+    """Archive old history, prune orphaned progress, then vacuum and analyze"""
+    migrate(PROGRESS_DB)
+    migrate(USERS_DB)
+    start = time.perf_counter()
+    size_before = file_bytes(PROGRESS_DB)
+
+    archived, path = archive_history(args.keep_days, args.archive_dir, args.chunk, args.pause)
+    print(f"Archived {archived} sessions older than {args.keep_days} days" + (f" to {path}" if path else ""))
+
+    users, rows = prune_orphans(args.chunk, args.pause)
+    print(f"Removed {rows} progress rows of {users} users missing from the users database")
+
+    pages, full_vacuum = compact(args.chunk, args.pause, args.convert_vacuum)
+    if pages is None:
+        print("Skipped vacuum: the database predates incremental vacuum. Run with --convert-vacuum "
+              "during a quiet period to convert it; the full VACUUM locks out writers until done")
+    else:
+        print(f"Freed {pages} pages" + (" (converted to incremental vacuum with a full VACUUM)"
+                                         if full_vacuum else ""))
+    print("Refreshed planner statistics")
+
+    size_after = file_bytes(PROGRESS_DB)
+    print(f"{PROGRESS_DB}: {size_before / 1e6:.2f} MB -> {size_after / 1e6:.2f} MB, "
+          f"reclaimed {(size_before - size_after) / 1e6:.2f} MB in {time.perf_counter() - start:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="French Tutor maintenance commands")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    rebuild = commands.add_parser('rebuild-scores', help=rebuild_scores.__doc__)
+    rebuild.set_defaults(func=rebuild_scores)
+
+    migrate_cmd = commands.add_parser('migrate', help=run_migrations.__doc__)
+    migrate_cmd.set_defaults(func=run_migrations)
+
+    check = commands.add_parser('check-indexes', help=check_indexes.__doc__)
+    check.set_defaults(func=check_indexes)
+
+    import_cmd = commands.add_parser('import-words', help=import_word_file.__doc__)
+    import_cmd.add_argument('csv_file')
+    import_cmd.add_argument('--deck', default=DEFAULT_DECK,
+                            help=f"deck to add the words to, created if new (default {DEFAULT_DECK})")
+    import_cmd.set_defaults(func=import_word_file)
+
+    maintain_cmd = commands.add_parser('maintain', help=maintain.__doc__)
+    maintain_cmd.add_argument('--keep-days', type=int, default=365,
+                              help="keep this many days of raw session history (default 365)")
+    maintain_cmd.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    maintain_cmd.add_argument('--chunk', type=int, default=MAINTENANCE_CHUNK,
+                              help="rows or pages per transaction")
+    maintain_cmd.add_argument('--pause', type=float, default=0.0,
+                              help="seconds to sleep between chunks")
+    maintain_cmd.add_argument('--convert-vacuum', action='store_true',
+                              help="one-time full VACUUM to enable incremental vacuum on an older "
+                                   "database; blocks writes while it runs")
+    maintain_cmd.set_defaults(func=maintain)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""In-process timing spans for the app's hot paths.
+
+``traced`` wraps functions and ``span`` wraps blocks; both record into
+per-name histograms and a ring buffer of recent spans. TracedConnection
+times every SQL statement the connection pool runs. Set
+FRENCH_TUTOR_METRICS=1 to turn recording on; when it is off a traced call
+costs one global check and SQL runs on plain sqlite3 connections.
+"""
+import os
+import re
+import time
+import sqlite3
+import threading
+from collections import deque
+from functools import wraps, lru_cache
+
+ENABLED = os.environ.get("FRENCH_TUTOR_METRICS", "") == "1"
+RING_SIZE = 1000
+
+# Histogram bucket upper bounds in seconds, Prometheus style
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Estimate the q-th quantile by interpolating inside its bucket"""
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(BUCKETS, self.counts):
+            if count and seen + count >= rank:
+                upper = min(bound, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.max
+
+
+class Recorder:
+    """Histograms per span name plus a ring buffer of the latest spans"""
+
+    def __init__(self, ring_size=RING_SIZE):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.recent = deque(maxlen=ring_size)
+
+    def record(self, name, seconds):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+            self.recent.append((time.time(), name, seconds))
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.recent.clear()
+
+    def summary(self):
+        """One row per span name, slowest total first"""
+        with self._lock:
+            rows = [{
+                'Span': name,
+                'Count': h.count,
+                'Total ms': h.total * 1000,
+                'Mean ms': h.total / h.count * 1000,
+                'p50 ms': h.quantile(0.50) * 1000,
+                'p95 ms': h.quantile(0.95) * 1000,
+                'Max ms': h.max * 1000,
+            } for name, h in self.histograms.items()]
+        return sorted(rows, key=lambda row: row['Total ms'], reverse=True)
+
+    def latest(self, limit=50):
+        with self._lock:
+            spans = list(self.recent)[-limit:]
+        return [{'At': time.strftime('%H:%M:%S', time.localtime(at)), 'Span': name,
+                 'ms': seconds * 1000} for at, name, seconds in reversed(spans)]
+
+    def prometheus(self):
+        """The histograms in Prometheus text exposition format"""
+        lines = [
+            '# HELP french_tutor_span_seconds Time spent in traced app code and SQL statements.',
+            '# TYPE french_tutor_span_seconds histogram',
+        ]
+        with self._lock:
+            for name, h in sorted(self.histograms.items()):
+                label = name.replace('\\', '\\\\').replace('"', '\\"')
+                cumulative = 0
+                for bound, count in zip(BUCKETS, h.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'french_tutor_span_seconds_bucket{{span="{label}",le="{le}"}} {cumulative}')
+                lines.append(f'french_tutor_span_seconds_sum{{span="{label}"}} {h.total}')
+                lines.append(f'french_tutor_span_seconds_count{{span="{label}"}} {h.count}')
+        return '\n'.join(lines) + '\n'
+
+
+recorder = Recorder()
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        recorder.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """Context manager timing a block under ``name``"""
+    return _Span(name) if ENABLED else _NO_SPAN
+
+
+def traced(func):
+    """Time every call of ``func`` under its qualified name"""
+    name = func.__qualname__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not ENABLED:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            recorder.record(name, time.perf_counter() - start)
+    return wrapper
+
+
+_TABLE = re.compile(
+    r'\b(?:FROM|INTO|UPDATE|TABLE|ON)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?(\w+)', re.IGNORECASE
+)
+
+
+@lru_cache(maxsize=512)
+def statement_name(sql):
+    """Low-cardinality span name for a statement: its verb and first table"""
+    words = sql.split(None, 2)
+    if not words:
+        return 'sql'
+    verb = words[0].upper()
+    if verb == 'PRAGMA' and len(words) > 1:
+        return f'sql PRAGMA {words[1].split("=")[0].split("(")[0].strip().lower()}'
+    table = _TABLE.search(sql)
+    return f'sql {verb} {table.group(1)}' if table else f'sql {verb}'
+
+
+class TracedCursor(sqlite3.Cursor):
+    def execute(self, sql, *args):
+        with span(statement_name(sql)):
+            return super().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        with span(statement_name(sql)):
+            return super().executemany(sql, *args)
+
+    def executescript(self, script):
+        with span('sql script'):
+            return super().executescript(script)
+
+
+class TracedConnection(sqlite3.Connection):
+    """Connection whose cursors time each statement they run"""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
@@ -1,5 +1,7 @@
 import streamlit as st
 from french_tutor import FrenchTutor
+from decks import deck_title
+import pandas as pd
 
 st.set_page_config(
     page_title="French Tutor - History",
@@ -34,7 +36,24 @@ st.title("📊 Practice History")
 
 tutor = FrenchTutor()
 if 'username' in st.session_state:
-    history = tutor.get_session_history(st.session_state.username)
+    st.caption(f"Deck: {deck_title(tutor.deck)}")
+    # Trends come from the daily/weekly rollups, so they cost the same for any history length
+    period = st.radio("Trend by", ["day", "week"], horizontal=True,
+                      format_func=lambda p: "Day" if p == "day" else "Week")
+    trends = tutor.get_history_trends(st.session_state.username, period)
+    if trends:
+        trend_df = pd.DataFrame(trends).set_index('Period')
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("Rating")
+            st.line_chart(trend_df[['Rating', 'Best Rating']])
+        with col2:
+            st.write("Words Attempted")
+            st.bar_chart(trend_df[['Words Attempted']])
+    
+    st.write("---")
+    page = st.number_input("Page", min_value=1, value=1, step=1)
+    history = tutor.get_session_history(st.session_state.username, page)
     if history:
         df = pd.DataFrame(history)
         st.dataframe(
@@ -48,6 +67,8 @@ if 'username' in st.session_state:
             },
             hide_index=True
         )
+    elif page > 1:
+        st.info("No more sessions.")
     else:
         st.info("No practice sessions yet. Start practicing to see your history!")
 else:
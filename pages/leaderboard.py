@@ -1,5 +1,6 @@
 import streamlit as st
 from french_tutor import FrenchTutor
+from decks import deck_title
 import pandas as pd
 
 st.set_page_config(
@@ -34,8 +35,14 @@ with st.sidebar:
 st.title("🏆 French Masters Leaderboard")
 
 tutor = FrenchTutor()
+st.caption(f"Deck: {deck_title(tutor.deck)}")
 leaderboard = tutor.get_leaderboard()
 
+if 'username' in st.session_state:
+    progress_stats = st.session_state.progress_stats
+    st.caption(f"Your rating: {progress_stats.rating(len(tutor.words)):.1f}% "
+               f"({progress_stats.perfect} words mastered, {progress_stats.practiced} practiced)")
+
 if leaderboard:
     df = pd.DataFrame(leaderboard)
     
@@ -0,0 +1,117 @@
+"""Practice runs as a few integers, checkpointed to the sessions table.
+
+A new-word run is a seeded permutation of the first ``deck_size`` words of
+the list, computed one position at a time, so neither session state nor
+the checkpoint ever holds the word order. The app walks it from
+``position`` and skips words the learner has already practiced, so
+(seed, deck_size, position) plus the progress table rebuild the run
+anywhere. Review runs need no order; they only carry their counters.
+"""
+import random
+from datetime import datetime
+
+CHECKPOINT_FIELDS = ('deck', 'source', 'seed', 'deck_size', 'position', 'word_count', 'practice_total')
+
+FEISTEL_ROUNDS = 4
+_MASK64 = (1 << 64) - 1
+
+
+def new_seed():
+    return random.getrandbits(63)
+
+
+def _mix(x):
+    """splitmix64 finalizer: a fast, well-spread 64-bit hash"""
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & _MASK64
+    return x ^ (x >> 31)
+
+
+class Permutation:
+    """A seeded shuffle of range(size) that computes one index at a time.
+
+    A balanced Feistel network is a bijection on the smallest even-bit
+    domain covering ``size``; cycle-walking re-encrypts values that land
+    past ``size`` until they fall inside it. The domain is under 4 * size,
+    so a lookup takes a few rounds on average and no memory at all.
+    """
+
+    def __init__(self, size, seed):
+        self.size = size
+        bits = max(2, (size - 1).bit_length())
+        self._half_bits = (bits + 1) // 2
+        self._mask = (1 << self._half_bits) - 1
+        self._keys = [_mix((seed + round * 0x9e3779b97f4a7c15) & _MASK64)
+                      for round in range(FEISTEL_ROUNDS)]
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        value = index
+        while True:
+            value = self._encrypt(value)
+            if value < self.size:
+                return value
+
+    def _encrypt(self, value):
+        left, right = value >> self._half_bits, value & self._mask
+        for key in self._keys:
+            left, right = right, left ^ (_mix(right ^ key) & self._mask)
+        return (left << self._half_bits) | right
+
+
+class Deck:
+    """A run's word order: the first ``deck_size`` words of the list, permuted by ``seed``"""
+
+    def __init__(self, vocabulary, seed, deck_size):
+        self.ids = vocabulary.ids
+        self.order = Permutation(min(deck_size, len(vocabulary)), seed)
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, position):
+        return self.ids[self.order[position]]
+
+    def unseen(self, position, seen):
+        """(position, word_id) of each word from ``position`` on that is not in ``seen``"""
+        for position in range(position, len(self)):
+            word_id = self[position]
+            if word_id not in seen:
+                yield position, word_id
+
+
+def write_checkpoints(conn, checkpoints):
+    """Store or (for a None state) clear each (user_id, state) checkpoint"""
+    now = datetime.now().isoformat()
+    saved = [(user_id, *(state[field] for field in CHECKPOINT_FIELDS), now)
+             for user_id, state in checkpoints if state is not None]
+    cleared = [(user_id,) for user_id, state in checkpoints if state is None]
+    if saved:
+        conn.executemany('''
+            INSERT INTO sessions
+            (user_id, deck, source, seed, deck_size, position, word_count, practice_total, last_updated)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                deck = excluded.deck,
+                source = excluded.source,
+                seed = excluded.seed,
+                deck_size = excluded.deck_size,
+                position = excluded.position,
+                word_count = excluded.word_count,
+                practice_total = excluded.practice_total,
+                last_updated = excluded.last_updated
+        ''', saved)
+    if cleared:
+        conn.executemany('DELETE FROM sessions WHERE user_id = ?', cleared)
+
+
+def load_checkpoint(conn, user_id):
+    """The user's unfinished run as a dict of CHECKPOINT_FIELDS, or None"""
+    row = conn.execute(f'''
+        SELECT {", ".join(CHECKPOINT_FIELDS)} FROM sessions WHERE user_id = ?
+    ''', (user_id,)).fetchone()
+    return dict(zip(CHECKPOINT_FIELDS, row)) if row else None
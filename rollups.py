@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+PERIODS = ('day', 'week')
+
+
+def period_start(period, session_date):
+    """First day of the day or (Monday-based) week that session_date falls in"""
+    day = datetime.fromisoformat(session_date).date()
+    if period == 'week':
+        day -= timedelta(days=day.weekday())
+    return day.isoformat()
+
+
+def record_session(conn, user_id, deck, session_date, words_attempted, words_correct,
+                   perfect_words, rating):
+    """Fold one practice session into the user's daily and weekly rollups for its deck.
+
+    Attempted words and session counts add up; correct, perfect and rating are
+    running totals for the user in the deck, so each rollup keeps the latest
+    value and the best rating seen in the period.
+    """
+    conn.executemany('''
+        INSERT INTO session_rollups
+        (user_id, deck, period, period_start, sessions, words_attempted,
+         words_correct, perfect_words, rating, best_rating)
+        VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, deck, period, period_start) DO UPDATE SET
+            sessions = sessions + 1,
+            words_attempted = words_attempted + excluded.words_attempted,
+            words_correct = excluded.words_correct,
+            perfect_words = excluded.perfect_words,
+            rating = excluded.rating,
+            best_rating = MAX(best_rating, excluded.rating)
+    ''', [(user_id, deck, period, period_start(period, session_date), words_attempted,
+           words_correct, perfect_words, rating, rating) for period in PERIODS])
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+# Leitner boxes: a perfect answer moves a word up one box, anything else
+# sends it back to box 1. Higher boxes come back less often.
+BOX_INTERVALS = {
+    1: timedelta(minutes=10),
+    2: timedelta(days=1),
+    3: timedelta(days=3),
+    4: timedelta(days=7),
+    5: timedelta(days=21),
+}
+MAX_BOX = max(BOX_INTERVALS)
+
+
+def next_review(box, attempts, practiced_at):
+    """New (box, due_at) for a word answered in ``attempts`` tries"""
+    box = min((box or 1) + 1, MAX_BOX) if attempts == 1 else 1
+    due_at = datetime.fromisoformat(practiced_at) + BOX_INTERVALS[box]
+    return box, due_at.isoformat()
+
+
+def schedule_reviews(conn, user_id, rows):
+    """Attach the next box and due time to (word_id, attempts, last_practiced) rows"""
+    scheduled = []
+    for word_id, attempts, last_practiced in rows:
+        current = conn.execute(
+            'SELECT box FROM progress WHERE user_id = ? AND word_id = ?',
+            (user_id, word_id)
+        ).fetchone()
+        box, due_at = next_review(current[0] if current else None, attempts, last_practiced)
+        scheduled.append((user_id, word_id, attempts, last_practiced, box, due_at))
+    return scheduled
+
+
+def due_words(conn, user_id, deck, limit, now=None):
+    """Up to ``limit`` ids of the deck's words due for review, most overdue first.
+
+    Walks the (user_id, due_at) index and checks each row against the
+    deck_words primary key, so the cost depends on ``limit`` rather than on
+    how many words the user has practiced. ``conn`` must see deck_words,
+    attached if it is not the progress database.
+    """
+    now = now or datetime.now().isoformat()
+    return [word_id for (word_id,) in conn.execute('''
+        SELECT p.word_id
+        FROM progress p
+        JOIN deck_words d ON d.deck = ? AND d.word_id = p.word_id
+        WHERE p.user_id = ? AND p.due_at <= ?
+        ORDER BY p.due_at
+        LIMIT ?
+    ''', (deck, user_id, now, limit))]
+
+
+def count_due(conn, user_id, deck, now=None):
+    """How many of the user's words in the deck are due, off the (user_id, due_at) index"""
+    now = now or datetime.now().isoformat()
+    return conn.execute('''
+        SELECT COUNT(*)
+        FROM progress p
+        JOIN deck_words d ON d.deck = ? AND d.word_id = p.word_id
+        WHERE p.user_id = ? AND p.due_at <= ?
+    ''', (deck, user_id, now)).fetchone()[0]
@@ -0,0 +1,135 @@
+"""Per-learner progress held in session state.
+
+WordStats keeps each word's attempts in a byte per word id, and
+ProgressStats the counts for the current deck behind the sidebar, session
+history and leaderboard. Both are loaded at login (the counters again on
+a deck switch) and then kept current answer by answer, so no page has to
+rescan a learner's progress.
+"""
+
+
+# Most bytes of array a practiced word may pay for; ids beyond that go to a dict
+DENSE_SPAN = 32
+MIN_DENSE_BYTES = 1024
+
+
+class WordStats:
+    """Attempts per word id in a bytearray, with the dict access the app uses.
+
+    A session holds one byte per word id instead of a dict entry per word
+    practiced; 0 marks a word never practiced. Attempts are 1 or 2 (the
+    tries the last answer took), so a byte holds them with room to spare.
+    The array only spans ids up to DENSE_SPAN bytes per practiced word, so
+    a few words with ids far above the rest are kept in a small dict
+    instead of stretching it.
+    """
+
+    __slots__ = ('_attempts', '_sparse', '_practiced')
+
+    def __init__(self, rows=()):
+        rows = list(rows)
+        limit = self._dense_limit(len(rows))
+        self._attempts = bytearray(max((word_id for word_id, _ in rows if word_id < limit), default=-1) + 1)
+        self._sparse = {}  # Ids at or past the end of the array
+        self._practiced = 0
+        for word_id, attempts in rows:
+            self[word_id] = attempts
+
+    @staticmethod
+    def _dense_limit(practiced):
+        return max(MIN_DENSE_BYTES, DENSE_SPAN * practiced)
+
+    def _grow(self, size):
+        """Extend the array to ``size`` bytes, moving the ids it now covers out of the dict"""
+        self._attempts.extend(bytes(size - len(self._attempts)))
+        for word_id in [word_id for word_id in self._sparse if word_id < size]:
+            self._attempts[word_id] = self._sparse.pop(word_id)
+
+    def __contains__(self, word_id):
+        if 0 <= word_id < len(self._attempts):
+            return self._attempts[word_id] != 0
+        return word_id in self._sparse
+
+    def __getitem__(self, word_id):
+        if word_id not in self:
+            raise KeyError(word_id)
+        return self._attempts[word_id] if word_id < len(self._attempts) else self._sparse[word_id]
+
+    def get(self, word_id, default=None):
+        return self[word_id] if word_id in self else default
+
+    def __setitem__(self, word_id, attempts):
+        if not 1 <= attempts <= 255:
+            raise ValueError(f"attempts must be between 1 and 255, got {attempts}")
+        if word_id >= len(self._attempts):
+            limit = self._dense_limit(self._practiced + 1)
+            if word_id >= limit:
+                if word_id not in self._sparse:
+                    self._practiced += 1
+                self._sparse[word_id] = attempts
+                return
+            # Double at least, so a run of new ids doesn't copy the array each time
+            self._grow(min(limit, max(word_id + 1, 2 * len(self._attempts))))
+        if not self._attempts[word_id]:
+            self._practiced += 1
+        self._attempts[word_id] = attempts
+
+    def __len__(self):
+        return self._practiced
+
+    def __iter__(self):
+        return (word_id for word_id, _ in self.items())
+
+    def items(self):
+        yield from ((word_id, attempts) for word_id, attempts in enumerate(self._attempts) if attempts)
+        yield from sorted(self._sparse.items())
+
+
+class ProgressStats:
+    """A learner's word counts in one deck, loaded once and then updated in O(1) per answer.
+
+    ``practiced`` words have attempts on record; of those, ``completed`` ones
+    took at most two tries, ``perfect`` ones a single try and ``wrong`` ones
+    more than one.
+    """
+
+    __slots__ = ('practiced', 'completed', 'perfect', 'wrong')
+
+    def __init__(self, practiced=0, completed=0, perfect=0, wrong=0):
+        self.practiced = practiced
+        self.completed = completed
+        self.perfect = perfect
+        self.wrong = wrong
+
+    @classmethod
+    def for_deck(cls, word_stats, vocabulary):
+        """Count the deck's words in a learner's word stats; one pass over the deck"""
+        stats = cls()
+        for word_id in vocabulary:
+            attempts = word_stats.get(word_id)
+            if attempts is not None:
+                stats.record(None, attempts)
+        return stats
+
+    def record(self, previous, attempts):
+        """Account for a word's attempts changing from ``previous`` (None if new)"""
+        if previous is None:
+            self.practiced += 1
+        else:
+            self._count(previous, -1)
+        self._count(attempts, 1)
+
+    def _count(self, attempts, step):
+        if attempts <= 2:
+            self.completed += step
+        if attempts == 1:
+            self.perfect += step
+        else:
+            self.wrong += step
+
+    def remaining(self, total_words):
+        return total_words - self.practiced
+
+    def rating(self, total_words):
+        """Share of the word list answered right on the first try, in percent"""
+        return (self.perfect / total_words * 100) if total_words > 0 else 0
@@ -0,0 +1,367 @@
+import os
+import io
+import hashlib
+import tempfile
+import time
+import wave
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from gtts import gTTS
+from database import DATA_DIR
+
+AUDIO_CACHE_DIR = os.environ.get(
+    "FRENCH_TUTOR_AUDIO_CACHE",
+    os.path.join(DATA_DIR, "audio_cache")
+)
+TTS_BACKEND = os.environ.get("FRENCH_TUTOR_TTS_BACKEND", "gtts")
+
+MAX_DISK_BYTES = 256 * 1024 * 1024
+MAX_MEMORY_BYTES = 16 * 1024 * 1024
+PREFETCH_WORKERS = 2
+PREFETCH_AHEAD = 5
+
+
+class TTSBackend:
+    """Turns text into audio bytes and keeps latency counters.
+
+    Subclasses implement ``_synthesize``; callers use ``synthesize``.
+    """
+
+    name = None
+    mime_type = "audio/mpeg"
+    extension = "mp3"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def _synthesize(self, text, lang):
+        raise NotImplementedError
+
+    def synthesize(self, text, lang):
+        start = time.perf_counter()
+        data = self._synthesize(text, lang)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.calls += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+        return data
+
+    def latency_stats(self):
+        with self._lock:
+            mean = self.total_seconds / self.calls if self.calls else 0.0
+            return {'backend': self.name, 'calls': self.calls,
+                    'mean_seconds': mean, 'max_seconds': self.max_seconds}
+
+
+class GTTSBackend(TTSBackend):
+    """MP3 speech from Google's TTS endpoint (needs network)"""
+
+    name = "gtts"
+
+    def _synthesize(self, text, lang):
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=lang).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class LocalBackend(TTSBackend):
+    """Offline WAV speech from espeak-ng/espeak, or pyttsx3 when installed"""
+
+    name = "local"
+    mime_type = "audio/wav"
+    extension = "wav"
+
+    def __init__(self):
+        super().__init__()
+        self.espeak = shutil.which("espeak-ng") or shutil.which("espeak")
+        self.engine = None
+        if self.espeak is None:
+            try:
+                import pyttsx3
+            except ImportError:
+                raise RuntimeError("Local TTS needs espeak-ng, espeak or pyttsx3 installed")
+            self.engine = pyttsx3.init()
+            self._engine_lock = threading.Lock()  # pyttsx3 engines are not thread-safe
+
+    def _synthesize(self, text, lang):
+        if self.espeak is not None:
+            result = subprocess.run(
+                [self.espeak, "-v", lang, "--stdout", text],
+                capture_output=True, check=True, timeout=30
+            )
+            return result.stdout
+
+        fd, path = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        try:
+            with self._engine_lock:
+                self.engine.save_to_file(text, path)
+                self.engine.runAndWait()
+            with open(path, 'rb') as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+
+class StubBackend(TTSBackend):
+    """Deterministic silent WAV, one tenth of a second per character, for tests"""
+
+    name = "stub"
+    mime_type = "audio/wav"
+    extension = "wav"
+
+    def _synthesize(self, text, lang):
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(1)
+            wav.setframerate(8000)
+            wav.writeframes(b'\x80' * 800 * max(1, len(text)))
+        return buffer.getvalue()
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (GTTSBackend, LocalBackend, StubBackend)
+}
+
+
+def get_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown TTS backend '{name}', choose from {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+class AudioCache:
+    """Content-addressed speech cache: an in-memory LRU in front of a directory.
+
+    Files are written to a temp name and renamed into place, so concurrent
+    sessions and processes only ever see complete files. When the directory
+    grows past ``max_disk_bytes`` the least recently read files are removed.
+    """
+
+    def __init__(self, directory, extension="mp3", max_disk_bytes=MAX_DISK_BYTES,
+                 max_memory_bytes=MAX_MEMORY_BYTES):
+        self.directory = directory
+        self.extension = extension
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._written_since_evict = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(text, lang):
+        return hashlib.sha256(f"{lang}\n{text}".encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.{self.extension}")
+
+    def _remember(self, key, data):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def contains(self, text, lang):
+        key = self.key(text, lang)
+        with self._lock:
+            if key in self._memory:
+                return True
+        return os.path.exists(self._path(key))
+
+    def get(self, text, lang):
+        key = self.key(text, lang)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # Mark as recently used for eviction
+        except FileNotFoundError:
+            return None
+
+        self._remember(key, data)
+        return data
+
+    def put(self, text, lang, data):
+        key = self.key(text, lang)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._remember(key, data)
+
+        with self._lock:
+            self._written_since_evict += len(data)
+            should_evict = self._written_since_evict > self.max_disk_bytes // 10
+            if should_evict:
+                self._written_since_evict = 0
+        if should_evict:
+            self.evict()
+
+    def get_or_create(self, text, lang, synthesize):
+        data = self.get(text, lang)
+        if data is None:
+            data = synthesize(text, lang)
+            self.put(text, lang, data)
+        return data
+
+    def evict(self):
+        """Remove least recently used files until the directory fits the limit"""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(f".{self.extension}"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # Removed by another process
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class AudioPrefetcher:
+    """Synthesizes upcoming words on a small thread pool ahead of need.
+
+    Each owner (one practice session) has a window of wanted words; a new
+    window cancels that owner's queued work that is no longer wanted. Work
+    for the same word is shared between owners.
+    """
+
+    def __init__(self, cache, synthesize, max_workers=PREFETCH_WORKERS):
+        self.cache = cache
+        self.synthesize = synthesize
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="tts-prefetch")
+        self._inflight = {}
+        self._owners = {}
+        self._lock = threading.RLock()  # Cancelling runs _done on the same thread
+
+    def _fetch(self, text, lang):
+        return self.cache.get_or_create(text, lang, self.synthesize)
+
+    def _done(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def prefetch(self, owner, texts, lang):
+        """Make ``texts`` the owner's window and queue any that aren't cached"""
+        wanted = set()
+        with self._lock:
+            for text in texts:
+                key = self.cache.key(text, lang)
+                wanted.add(key)
+                if key in self._inflight or self.cache.contains(text, lang):
+                    continue
+                future = self._executor.submit(self._fetch, text, lang)
+                self._inflight[key] = future
+                future.add_done_callback(lambda f, key=key: self._done(key, f))
+
+            stale = self._owners.pop(owner, set()) - wanted
+            if any(key in self._inflight for key in wanted):
+                self._owners[owner] = wanted
+            self._cancel(stale)
+
+    def _cancel(self, keys):
+        still_wanted = set().union(*self._owners.values()) if self._owners else set()
+        for key in keys - still_wanted:
+            future = self._inflight.get(key)
+            if future is not None and future.cancel():
+                self._inflight.pop(key, None)
+
+    def cancel(self, owner):
+        """Drop the owner's window, cancelling queued work nobody else wants"""
+        with self._lock:
+            keys = self._owners.pop(owner, set())
+            self._cancel(keys)
+
+    def get(self, text, lang, timeout=None):
+        """Audio for text, waiting on a prefetch in flight rather than repeating it"""
+        with self._lock:
+            future = self._inflight.get(self.cache.key(text, lang))
+        if future is not None:
+            try:
+                return future.result(timeout=timeout)
+            except Exception:
+                pass  # Cancelled or failed in the background, synthesize below
+        return self._fetch(text, lang)
+
+
+def measure_latency(backend_names, texts, lang='fr'):
+    """Synthesize texts with each backend, bypassing the cache.
+
+    Yields (name, stats, error) as each backend finishes; a backend that
+    can't be created or fails to synthesize, e.g. gTTS offline, comes back
+    with the error instead of stats so the others still get measured.
+    """
+    for name in backend_names:
+        try:
+            backend = get_backend(name)
+            for text in texts:
+                backend.synthesize(text, lang)
+        except Exception as e:
+            yield name, None, e
+        else:
+            yield name, backend.latency_stats(), None
+
+
+# Each backend caches into its own directory since their audio formats differ
+tts_backend = get_backend(TTS_BACKEND)
+audio_cache = AudioCache(os.path.join(AUDIO_CACHE_DIR, tts_backend.name),
+                         extension=tts_backend.extension)
+audio_prefetcher = AudioPrefetcher(audio_cache, tts_backend.synthesize)
+
+
+if __name__ == "__main__":
+    import csv
+    import sys
+
+    csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'french_words.csv')
+    with open(csv_path, 'r') as file:
+        words = [row['french'] for row in csv.DictReader(file)]
+
+    for name, stats, error in measure_latency(sys.argv[1:] or list(BACKENDS), words):
+        if error is not None:
+            print(f"{name:>6}: unavailable ({error})", flush=True)
+            continue
+        print(f"{stats['backend']:>6}: {stats['calls']} calls, "
+              f"mean {stats['mean_seconds'] * 1000:.1f} ms, max {stats['max_seconds'] * 1000:.1f} ms", flush=True)
@@ -0,0 +1,195 @@
+import os
+import io
+import csv
+import tempfile
+import shutil
+from array import array
+
+WORDS_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'french_words.csv')
+IMPORT_BATCH_ROWS = 5000
+
+
+def read_word_pairs(csv_path):
+    """(spanish, french) pairs from a word list CSV, in file order"""
+    with open(csv_path, 'r') as file:
+        reader = csv.DictReader(file)
+        return [(row['spanish'], row['french']) for row in reader]
+
+
+def sync_words(conn, pairs):
+    """Add any new pairs to the words table and return them as a Vocabulary"""
+    conn.executemany(
+        'INSERT OR IGNORE INTO words (spanish, french) VALUES (?, ?)', pairs
+    )
+    ids = {(spanish, french): word_id
+           for word_id, spanish, french in conn.execute('SELECT id, spanish, french FROM words')}
+
+    rows = []
+    seen = set()
+    for pair in pairs:
+        word_id = ids[pair]
+        if word_id not in seen:
+            seen.add(word_id)
+            rows.append((word_id, pair[0], pair[1]))
+    return Vocabulary(rows)
+
+
+def _append_imported_words(conn, csv_path):
+    """Atomically replace the CSV, or create it, with its words plus those in temp.import_added"""
+    directory = os.path.dirname(os.path.abspath(csv_path))
+    os.makedirs(directory, exist_ok=True)
+    exists = os.path.exists(csv_path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.csv.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            if exists:
+                with open(csv_path, 'rb') as current:
+                    shutil.copyfileobj(current, out)
+                    if current.tell() > 0:
+                        current.seek(-1, os.SEEK_END)
+                        if current.read(1) != b'\n':
+                            out.write(b'\n')
+            else:
+                out.write(b'spanish,french\n')
+            text = io.TextIOWrapper(out, encoding='utf-8', newline='')
+            writer = csv.writer(text, lineterminator='\n')
+            writer.writerows(conn.execute('''
+                SELECT w.spanish, w.french
+                FROM temp.import_added a
+                JOIN words w ON w.id = a.word_id
+                ORDER BY a.seq
+            '''))
+            text.flush()
+            text.detach()
+            os.fsync(out.fileno())
+        if exists:
+            shutil.copymode(csv_path, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o644)  # Not mkstemp's owner-only 0600
+        os.replace(tmp_path, csv_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def import_words(conn, upload, csv_path, progress=None):
+    """Stream word pairs from an uploaded CSV into a deck's word list.
+
+    ``upload`` is a binary file object read in batches of IMPORT_BATCH_ROWS.
+    Each batch joins the words table in its own short write transaction,
+    so learners' saves get in between; pairs already known are skipped,
+    which makes a retried import harmless. Which pairs the deck at
+    ``csv_path`` doesn't have yet is tracked in temp tables kept on disk,
+    so memory stays flat however large the upload is. Those pairs are
+    appended to the deck's CSV with one atomic rename at the end, so a
+    failure leaves the file as it was; a deck without a CSV yet gets one
+    only once it has words.
+
+    ``conn`` must not be in a transaction. Returns (rows read, words added
+    to the deck).
+    """
+    text = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+    try:
+        return _import_rows(conn, csv.DictReader(text), csv_path, progress)
+    finally:
+        text.detach()  # Leave the caller's file object open
+
+
+def _pair_batches(reader):
+    batch = []
+    for row in reader:
+        batch.append((row['spanish'], row['french']))
+        if len(batch) >= IMPORT_BATCH_ROWS:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _write_batch(conn, batch, track_sql):
+    """Add a batch to the words table and track its ids, in one short write transaction"""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.executemany('INSERT OR IGNORE INTO words (spanish, french) VALUES (?, ?)', batch)
+        conn.executemany(track_sql, batch)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def _import_rows(conn, reader, csv_path, progress):
+    if not reader.fieldnames or not {'spanish', 'french'} <= set(reader.fieldnames):
+        raise ValueError("CSV must have 'spanish' and 'french' columns")
+
+    # Changing temp_store drops temp tables, so switch before creating ours
+    temp_store = conn.execute('PRAGMA temp_store').fetchone()[0]
+    conn.execute('PRAGMA temp_store = FILE')
+    try:
+        conn.execute('CREATE TEMP TABLE import_known (word_id INTEGER PRIMARY KEY)')
+        conn.execute('CREATE TEMP TABLE import_added (seq INTEGER PRIMARY KEY, word_id INTEGER UNIQUE)')
+
+        # Words the deck already has
+        if os.path.exists(csv_path):
+            with open(csv_path, 'r', newline='') as current:
+                for batch in _pair_batches(csv.DictReader(current)):
+                    _write_batch(conn, batch, '''
+                        INSERT OR IGNORE INTO import_known (word_id)
+                        SELECT id FROM words WHERE spanish = ? AND french = ?
+                    ''')
+
+        rows_read = 0
+        for batch in _pair_batches(reader):
+            # New to the deck, in upload order; the unique word_id drops repeats
+            _write_batch(conn, batch, '''
+                INSERT OR IGNORE INTO import_added (word_id)
+                SELECT id FROM words
+                WHERE spanish = ? AND french = ?
+                  AND id NOT IN (SELECT word_id FROM import_known)
+            ''')
+            rows_read += len(batch)
+            if progress:
+                progress(rows_read)
+
+        added = conn.execute('SELECT COUNT(*) FROM import_added').fetchone()[0]
+        if added:
+            _append_imported_words(conn, csv_path)
+        return rows_read, added
+    finally:
+        conn.execute('DROP TABLE IF EXISTS temp.import_known')
+        conn.execute('DROP TABLE IF EXISTS temp.import_added')
+        conn.execute(f'PRAGMA temp_store = {temp_store}')
+
+
+class Vocabulary:
+    """The active word list as arrays in list order, looked up by integer word id.
+
+    ``ids``, ``spanish`` and ``french`` run in parallel in word list order,
+    and a dict from word id to position finds a word, so the cost follows
+    the deck's size rather than how high its word ids go.
+    """
+
+    def __init__(self, rows=()):
+        self.ids = array('l')
+        self.spanish = []
+        self.french = []
+        self._positions = {}
+        for word_id, spanish, french in rows:
+            self._positions[word_id] = len(self.ids)
+            self.ids.append(word_id)
+            self.spanish.append(spanish)
+            self.french.append(french)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __contains__(self, word_id):
+        return word_id in self._positions
+
+    def pair(self, word_id):
+        position = self._positions[word_id]
+        return self.spanish[position], self.french[position]
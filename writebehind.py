@@ -0,0 +1,241 @@
+"""Progress, session-history and checkpoint writes, optionally batched behind a queue.
+
+With FRENCH_TUTOR_WRITE_BEHIND=1 the app hands its writes to a background
+thread that commits them in batches, once FLUSH_ROWS records are waiting or
+FLUSH_SECONDS have passed, and again at interpreter exit. Otherwise every
+save is its own transaction in the script thread, as before.
+
+Pending progress is keyed by (user, word) and checkpoints by user, so
+repeated answers to a word or moves through a run collapse into one row.
+When MAX_PENDING records are waiting the submitting thread writes the
+batch itself, which bounds memory and pushes back on callers if the
+database falls behind. Readers that must see their own latest writes call
+``writer.flush()`` first. A record that can't be written is logged and
+dropped rather than retried forever.
+"""
+import os
+import atexit
+import logging
+import sqlite3
+import threading
+from database import transaction, PROGRESS_DB
+from scheduler import schedule_reviews
+from rollups import record_session
+from practice import write_checkpoints
+
+WRITE_BEHIND = os.environ.get("FRENCH_TUTOR_WRITE_BEHIND", "") == "1"
+FLUSH_ROWS = 500
+FLUSH_SECONDS = 1.0
+MAX_PENDING = 10000
+
+log = logging.getLogger(__name__)
+
+
+def write_progress(conn, rows):
+    """Upsert (user_id, word_id, attempts, last_practiced) rows with their next review"""
+    by_user = {}
+    for user_id, word_id, attempts, last_practiced in rows:
+        by_user.setdefault(user_id, []).append((word_id, attempts, last_practiced))
+
+    scheduled = []
+    for user_id, user_rows in by_user.items():
+        scheduled.extend(schedule_reviews(conn, user_id, user_rows))
+
+    # One prepared statement for the whole batch
+    conn.executemany('''
+        INSERT INTO progress (user_id, word_id, attempts, last_practiced, box, due_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, word_id) DO UPDATE SET
+            attempts = excluded.attempts,
+            last_practiced = excluded.last_practiced,
+            box = excluded.box,
+            due_at = excluded.due_at
+    ''', scheduled)
+
+
+def write_sessions(conn, sessions):
+    """Insert (user_id, deck, session_date, attempted, correct, perfect, rating) sessions and roll them up"""
+    conn.executemany('''
+        INSERT INTO session_history
+        (user_id, deck, session_date, words_attempted, words_correct, perfect_words, rating)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', sessions)
+    for session in sessions:
+        record_session(conn, *session)
+
+
+class DirectWriter:
+    """Writes each save in its own transaction, in the calling thread"""
+
+    def __init__(self, name=PROGRESS_DB):
+        self.name = name
+
+    def save(self, progress=(), sessions=(), checkpoints=()):
+        """Write progress rows, finished sessions and (user_id, state) checkpoints together"""
+        if not progress and not sessions and not checkpoints:
+            return  # Don't take the write lock for nothing, e.g. a guest's empty checkpoint
+        with transaction(self.name) as conn:
+            if progress:
+                write_progress(conn, progress)
+            if sessions:
+                write_sessions(conn, sessions)
+            if checkpoints:
+                write_checkpoints(conn, checkpoints)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class WriteBehindQueue:
+    """Buffers saves and commits them from a background thread in batches"""
+
+    def __init__(self, name=PROGRESS_DB, flush_rows=FLUSH_ROWS,
+                 flush_seconds=FLUSH_SECONDS, max_pending=MAX_PENDING):
+        self.name = name
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._write_lock = threading.Lock()  # One batch in flight at a time
+        self._progress = {}  # (user_id, word_id) -> (attempts, last_practiced)
+        self._sessions = []
+        self._checkpoints = {}  # user_id -> state, None to clear
+        self._thread = None
+        self._closed = False
+
+    def _pending(self):
+        return len(self._progress) + len(self._sessions) + len(self._checkpoints)
+
+    def save(self, progress=(), sessions=(), checkpoints=()):
+        with self._lock:
+            for user_id, word_id, attempts, last_practiced in progress:
+                self._progress.pop((user_id, word_id), None)  # Keep dict order = write order
+                self._progress[(user_id, word_id)] = (attempts, last_practiced)
+            self._sessions.extend(sessions)
+            self._checkpoints.update(checkpoints)
+        self._submitted()
+
+    def _submitted(self):
+        with self._lock:
+            if self._closed:
+                full = True  # Nobody left to write it; do it now
+            else:
+                full = self._pending() >= self.max_pending
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                    self._thread.start()
+                if self._pending() >= self.flush_rows:
+                    self._wakeup.notify()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write everything submitted so far before returning.
+
+        If the batch fails it is retried a record at a time, and records
+        that fail on their own, like a malformed session, are logged and
+        dropped so they can't hold up the rest. When the database itself
+        fails (sqlite3.OperationalError, e.g. a lock timeout) whatever is
+        unwritten goes back on the queue, within max_pending, and the
+        error is raised.
+        """
+        with self._write_lock:
+            with self._lock:
+                progress, self._progress = self._progress, {}
+                sessions, self._sessions = self._sessions, []
+                checkpoints, self._checkpoints = self._checkpoints, {}
+            if not progress and not sessions and not checkpoints:
+                return
+            try:
+                self._write(progress, sessions, checkpoints)
+            except Exception as e:
+                if isinstance(e, sqlite3.OperationalError):
+                    self._requeue(progress, sessions, checkpoints)
+                    raise
+                log.warning("Write-behind batch failed (%s); retrying record by record", e)
+                self._write_each(progress, sessions, checkpoints)
+            except BaseException:
+                self._requeue(progress, sessions, checkpoints)
+                raise
+
+    def _write(self, progress, sessions, checkpoints):
+        with transaction(self.name) as conn:
+            write_progress(conn, [key + value for key, value in progress.items()])
+            write_sessions(conn, sessions)
+            write_checkpoints(conn, list(checkpoints.items()))
+
+    def _write_each(self, progress, sessions, checkpoints):
+        records = ([({key: value}, [], {}) for key, value in progress.items()]
+                   + [({}, [session], {}) for session in sessions]
+                   + [({}, [], {user_id: state}) for user_id, state in checkpoints.items()])
+        for i, record in enumerate(records):
+            try:
+                self._write(*record)
+            except BaseException as e:
+                if isinstance(e, Exception) and not isinstance(e, sqlite3.OperationalError):
+                    log.exception("Dropping write-behind record that can't be written: %r", record)
+                    continue
+                # The database failed, not the record: keep the rest for later
+                progress, sessions, checkpoints = {}, [], {}
+                for record_progress, record_sessions, record_checkpoints in records[i:]:
+                    progress.update(record_progress)
+                    sessions.extend(record_sessions)
+                    checkpoints.update(record_checkpoints)
+                self._requeue(progress, sessions, checkpoints)
+                raise
+
+    def _requeue(self, progress, sessions, checkpoints):
+        """Put unwritten records back behind anything newer, dropping the oldest past max_pending"""
+        with self._lock:
+            # Records superseded by a newer save are already covered
+            records = ([(self._progress, key, value) for key, value in progress.items()
+                        if key not in self._progress]
+                       + [(None, None, session) for session in sessions]
+                       + [(self._checkpoints, user_id, state) for user_id, state in checkpoints.items()
+                          if user_id not in self._checkpoints])
+            dropped = max(0, len(records) - max(0, self.max_pending - self._pending()))
+            requeued_sessions = []
+            for pending, key, value in records[dropped:]:
+                if pending is None:
+                    requeued_sessions.append(value)
+                else:
+                    pending[key] = value
+            self._sessions[:0] = requeued_sessions
+        if dropped:
+            log.error("Write-behind queue full; dropped %d unwritten records", dropped)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._wakeup.wait_for(
+                    lambda: self._closed or self._pending() >= self.flush_rows,
+                    timeout=self.flush_seconds
+                )
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Write-behind flush failed; will retry")
+                if not closed:
+                    with self._lock:
+                        self._wakeup.wait(self.flush_seconds)
+            if closed:
+                return
+
+    def close(self):
+        """Stop the writer thread after a final flush"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+            self._wakeup.notify()
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+
+writer = WriteBehindQueue() if WRITE_BEHIND else DirectWriter()
+atexit.register(writer.close)